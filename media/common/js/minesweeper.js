@@ -1,3 +1,48 @@
+// Version of the board currently displayed, used to check that move changes apply to it
+var board_version = null;
+var board_url = null;
+// Encoding requested for full boards: 'json', 'base64' or 'rle'
+var board_encoding = 'rle';
+
+// WebSocket open on the current game, or null to use the AJAX views
+var game_socket = null;
+
+// Buttons of the board by x * board_size + y and the value each one shows, so that an
+// update only touches the cells that changed, see init_board
+var cell_index = [];
+var cell_values = [];
+var cell_index_size = 0;
+
+// Large boards are shown in tiles loaded as they scroll into view, see
+// init_tiled_board.  Null when the board is rendered as buttons.
+var tiled_board = null;
+var CELL_PIXELS = 20;
+
+// Public codes used by the compact board encodings, values 0-8 are visible values
+var HIDDEN_CODE = 9;
+var FLAGGED_CODE = 10;
+var MINED_CODE = 11;
+
+function getCookie(name) {
+    var cookies = document.cookie ? document.cookie.split(';') : [];
+    for (var i = 0; i < cookies.length; i++) {
+        var cookie = $.trim(cookies[i]);
+        if (cookie.substring(0, name.length + 1) == (name + '=')) {
+            return decodeURIComponent(cookie.substring(name.length + 1));
+        }
+    }
+    return null;
+}
+
+// Moves and resets are POSTed, so send the CSRF token with every unsafe request
+$.ajaxSetup({
+    beforeSend: function (xhr, settings) {
+        if (!/^(GET|HEAD|OPTIONS|TRACE)$/.test(settings.type) && !this.crossDomain) {
+            xhr.setRequestHeader('X-CSRFToken', getCookie('csrftoken'));
+        }
+    }
+});
+
 function toggle_flag_button(){
     $('#toggle-flag').toggleClass('activated');
     $('#toggle-flag').toggleClass('not-activated');
@@ -8,27 +53,76 @@ function toggle_flag_button(){
     }
 }
 
+function open_game_socket(url, game_id){
+    // Sends moves over a WebSocket when the server provides one, falling back to the
+    // AJAX views whenever the socket is not open.
+    if (!window.WebSocket){
+        return;
+    }
+    var socket = new WebSocket(url);
+    socket.onopen = function () {
+        game_socket = socket;
+    };
+    socket.onclose = function () {
+        game_socket = null;
+    };
+    socket.onmessage = function (event) {
+        var data = JSON.parse(event.data);
+        if (data.action == 'changes'){
+            handle_move_response(game_id, data);
+        } else if (data.action == 'boardstate'){
+            show_boardstate(data, data.message);
+        }
+    };
+}
+
 function reset_game(url, game_id){
     $('#message').html('');
+    if (game_socket !== null){
+        game_socket.send(JSON.stringify({'action': 'reset', 'encoding': board_encoding}));
+        return;
+    }
+    $.ajax({
+        url: url,
+        type: 'POST',
+        data: {
+            'game_id': game_id,
+            'encoding': board_encoding
+        },
+        dataType: 'json',
+        success: function (data) {
+            show_boardstate(data, data.message);
+        }
+    });
+}
+
+function load_boardstate(url, game_id, message){
     $.ajax({
         url: url,
         data: {
-            'game_id': game_id
+            'game_id': game_id,
+            'encoding': board_encoding
         },
         dataType: 'json',
         success: function (data) {
-            update_boardstate(
-                data.game_status,
-                data.message,
-                data.json_boardstate
-            );
+            show_boardstate(data, message);
         }
     });
 }
 
 function submit_move(url,game_id, x, y, move_type) {
+    if (game_socket !== null){
+        game_socket.send(JSON.stringify({
+            'action': 'move',
+            'x': parseInt(x),
+            'y': parseInt(y),
+            'move_type': move_type
+        }));
+        return;
+    }
     $.ajax({
         url: url,
+        type: 'POST',
         data: {
             'game_id': game_id,
             'x': x,
@@ -37,15 +131,69 @@ function submit_move(url,game_id, x, y, move_type) {
         },
         dataType: 'json',
         success: function (data) {
-            update_boardstate(
-                data.game_status,
-                data.message,
-                data.json_boardstate
-            );
+            handle_move_response(game_id, data);
+        }
+    });
+}
+
+function submit_moves(url, game_id, moves) {
+    // Submits a list of [x, y, move_type] moves to be applied together.
+    if (game_socket !== null){
+        game_socket.send(JSON.stringify({'action': 'moves', 'moves': moves}));
+        return;
+    }
+    $.ajax({
+        url: url,
+        type: 'POST',
+        data: {
+            'game_id': game_id,
+            'moves': JSON.stringify(moves)
+        },
+        dataType: 'json',
+        success: function (data) {
+            handle_move_response(game_id, data);
         }
     });
 }
 
+function handle_move_response(game_id, data) {
+    if (data.version === undefined){
+        return;
+    }
+    // The changes only apply to the board they were made against, otherwise
+    // fetch the whole board.  Moves that change too many cells send no changes.
+    if (data.base_version === board_version && data.changes !== null){
+        board_version = data.version;
+        apply_boardstate_changes(
+            data.game_status,
+            data.message,
+            data.changes
+        );
+    } else if (tiled_board !== null){
+        board_version = data.version;
+        reload_tiles();
+        show_game_status(data.game_status, data.message);
+    } else {
+        load_boardstate(board_url, game_id, data.message);
+    }
+}
+
+function show_boardstate(data, message) {
+    board_version = data.version;
+    if (tiled_board !== null){
+        reload_tiles();
+        show_game_status(data.game_status, message);
+    } else {
+        update_boardstate(
+            data.game_status,
+            message,
+            data.json_boardstate,
+            data.encoding,
+            data.board_size
+        );
+    }
+}
+
 function render_new_game_modal(url) {
     var csrftoken = getCookie('csrftoken');
     $('.new_game_modal_container').html('').load(
@@ -59,30 +207,122 @@ function render_new_game_modal(url) {
     );
 }
 
-function update_boardstate(game_status, message, boardstate) {
-    console.log(game_status);
-    var boardstate_obj = $.parseJSON(boardstate);
-    $.each(boardstate_obj, function(index_x, row) {
-        $.each(row, function(index_y, column) {
-            var $btn = $("button[x$='" + index_x +"'][y$='" +index_y+ "']");
-            if (column !== null){
-                if (column == 'mined'){
-                $btn.attr('class', 'location bomb').html('<i class="fa fa-bomb" aria-hidden="true"></i>');
-                } else if(column == 'flagged') {
-                    $btn.attr('class', 'location flag').html('<i class="fa fa-flag" aria-hidden="true"></i>');
-                } else {
-                    $btn.attr('class', 'location visible');
-                    if (column === 0) {
-                        $btn.html('');
-                    } else {
-                        $btn.html(column);
-                    }
-                }
-            } else{
-                $btn.html('').attr('class', 'location');
-            }
-        });
+function init_board(board_size) {
+    // Indexes the buttons of the board once, so that cells can be found without
+    // searching the page.
+    cell_index = [];
+    cell_values = [];
+    cell_index_size = board_size;
+    $('#gameboard button.location').each(function () {
+        var index = Number(this.getAttribute('x')) * board_size + Number(this.getAttribute('y'));
+        cell_index[index] = this;
     });
+    // Buttons are 32px wide with their margins
+    $('#gamewrapper').css('width', board_size * 32);
+}
+
+function render_cell(x, y, value) {
+    if (tiled_board !== null){
+        render_tile_cell(x, y, value);
+        return;
+    }
+    var index = Number(x) * cell_index_size + Number(y);
+    var btn = cell_index[index];
+    if (btn === undefined || cell_values[index] === value){
+        return;
+    }
+    cell_values[index] = value;
+    if (value !== null){
+        if (value == 'mined'){
+            btn.className = 'location bomb';
+            btn.innerHTML = '<i class="fa fa-bomb" aria-hidden="true"></i>';
+        } else if(value == 'flagged') {
+            btn.className = 'location flag';
+            btn.innerHTML = '<i class="fa fa-flag" aria-hidden="true"></i>';
+        } else {
+            btn.className = 'location visible';
+            btn.innerHTML = value === 0 ? '' : value;
+        }
+    } else{
+        btn.className = 'location';
+        btn.innerHTML = '';
+    }
+}
+
+function decode_board_codes(codes, board_size) {
+    // Turns a flat list of public cell codes (an Array or a Uint8Array from a binary
+    // response) into the same 2D array the JSON encoding provides.
+    var boardstate = [];
+    for (var x = 0; x < board_size; x++) {
+        var row = [];
+        for (var y = 0; y < board_size; y++) {
+            row.push(code_value(codes[x * board_size + y]));
+        }
+        boardstate.push(row);
+    }
+    return boardstate;
+}
+
+function code_value(code) {
+    // Returns the value render_cell takes for a public cell code.
+    if (code == HIDDEN_CODE) {
+        return null;
+    } else if (code == FLAGGED_CODE) {
+        return 'flagged';
+    } else if (code == MINED_CODE) {
+        return 'mined';
+    }
+    return code;
+}
+
+function decode_boardstate(boardstate, encoding, board_size) {
+    if (!encoding || encoding == 'json') {
+        return $.parseJSON(boardstate);
+    }
+    return decode_board_codes(decode_codes(boardstate, encoding), board_size);
+}
+
+function decode_codes(encoded, encoding) {
+    // Decodes base64 or run-length encoded public codes into a flat list.
+    var bytes = atob(encoded);
+    var codes = [];
+    var i;
+    if (encoding == 'rle') {
+        for (i = 0; i < bytes.length; i += 2) {
+            var run_length = bytes.charCodeAt(i);
+            var code = bytes.charCodeAt(i + 1);
+            for (var j = 0; j < run_length; j++) {
+                codes.push(code);
+            }
+        }
+    } else {
+        for (i = 0; i < bytes.length; i++) {
+            codes.push(bytes.charCodeAt(i));
+        }
+    }
+    return codes;
+}
+
+function update_boardstate(game_status, message, boardstate, encoding, board_size) {
+    // render_cell skips the cells that already show the right value
+    var boardstate_obj = decode_boardstate(boardstate, encoding, board_size);
+    for (var x = 0; x < boardstate_obj.length; x++) {
+        var row = boardstate_obj[x];
+        for (var y = 0; y < row.length; y++) {
+            render_cell(x, y, row[y]);
+        }
+    }
+    show_game_status(game_status, message);
+}
+
+function apply_boardstate_changes(game_status, message, changes) {
+    for (var i = 0; i < changes.length; i++) {
+        render_cell(changes[i][0], changes[i][1], changes[i][2]);
+    }
+    show_game_status(game_status, message);
+}
+
+function show_game_status(game_status, message) {
     if (game_status !== 0){
         var modal_title = '';
         if (game_status==1) {
@@ -97,3 +337,160 @@ function update_boardstate(game_status, message, boardstate) {
 
     }
 }
+
+function init_tiled_board(tile_url, move_url, game_id, board_size, tile_size) {
+    tiled_board = {
+        'tile_url': tile_url,
+        'game_id': game_id,
+        'board_size': board_size,
+        'tile_size': tile_size,
+        // Tiles by 'tile_x,tile_y', null while loading
+        'tiles': {}
+    };
+    $('#board-tiles').css({
+        'width': board_size * CELL_PIXELS,
+        'height': board_size * CELL_PIXELS
+    }).bind('click', function(e) {
+        e.preventDefault();
+        var offset = $(this).offset();
+        var x = Math.floor((e.pageY - offset.top) / CELL_PIXELS);
+        var y = Math.floor((e.pageX - offset.left) / CELL_PIXELS);
+        var move_type = $('#toggle-flag').val();
+        if (move_type == 'clear' && typeof tile_cell_value(x, y) == 'number') {
+            move_type = 'chord';
+        }
+        submit_move(move_url, game_id, x, y, move_type);
+    });
+    $('#board-viewport').bind('scroll', load_visible_tiles);
+    $(window).bind('resize', load_visible_tiles);
+    load_visible_tiles();
+}
+
+function load_visible_tiles() {
+    var $viewport = $('#board-viewport');
+    var tile_pixels = tiled_board.tile_size * CELL_PIXELS;
+    var last_tile = Math.ceil(tiled_board.board_size / tiled_board.tile_size) - 1;
+    var top = $viewport.scrollTop();
+    var left = $viewport.scrollLeft();
+    var last_x = Math.min(last_tile, Math.floor((top + $viewport.innerHeight()) / tile_pixels));
+    var last_y = Math.min(last_tile, Math.floor((left + $viewport.innerWidth()) / tile_pixels));
+    for (var tile_x = Math.floor(top / tile_pixels); tile_x <= last_x; tile_x++) {
+        for (var tile_y = Math.floor(left / tile_pixels); tile_y <= last_y; tile_y++) {
+            if (tiled_board.tiles[tile_x + ',' + tile_y] === undefined) {
+                load_tile(tile_x, tile_y);
+            }
+        }
+    }
+}
+
+function reload_tiles() {
+    $('#board-tiles canvas').remove();
+    tiled_board.tiles = {};
+    load_visible_tiles();
+}
+
+function load_tile(tile_x, tile_y) {
+    var key = tile_x + ',' + tile_y;
+    tiled_board.tiles[key] = null;
+    $.ajax({
+        url: tiled_board.tile_url,
+        data: {
+            'game_id': tiled_board.game_id,
+            'tile_x': tile_x,
+            'tile_y': tile_y
+        },
+        dataType: 'json',
+        success: function (data) {
+            if (data.version === undefined || tiled_board.tiles[key] !== null){
+                return;
+            }
+            // Every tile shown has to be from the same version of the board
+            if (data.version > board_version){
+                board_version = data.version;
+                reload_tiles();
+            } else if (data.version < board_version){
+                load_tile(tile_x, tile_y);
+            } else {
+                draw_tile(key, data);
+            }
+        },
+        error: function () {
+            delete tiled_board.tiles[key];
+        }
+    });
+}
+
+function draw_tile(key, data) {
+    var canvas = document.createElement('canvas');
+    canvas.width = data.height * CELL_PIXELS;
+    canvas.height = data.width * CELL_PIXELS;
+    $(canvas).css({'top': data.x * CELL_PIXELS, 'left': data.y * CELL_PIXELS});
+    $('#board-tiles').append(canvas);
+
+    var tile = {
+        'canvas': canvas,
+        'x': data.x,
+        'y': data.y,
+        'width': data.width,
+        'height': data.height,
+        'values': []
+    };
+    tiled_board.tiles[key] = tile;
+    var codes = decode_codes(data.tile, data.encoding);
+    for (var i = 0; i < codes.length; i++) {
+        draw_tile_cell(
+            tile,
+            data.x + Math.floor(i / data.height),
+            data.y + i % data.height,
+            code_value(codes[i])
+        );
+    }
+}
+
+function get_tile(x, y) {
+    // Returns the loaded tile holding the cell at x, y, or null.
+    var tile_size = tiled_board.tile_size;
+    return tiled_board.tiles[Math.floor(x / tile_size) + ',' + Math.floor(y / tile_size)] || null;
+}
+
+function tile_cell_value(x, y) {
+    var tile = get_tile(x, y);
+    if (tile === null){
+        return undefined;
+    }
+    return tile.values[(x - tile.x) * tile.height + (y - tile.y)];
+}
+
+function render_tile_cell(x, y, value) {
+    // Cells of tiles that are not loaded are drawn when their tile is.
+    var tile = get_tile(x, y);
+    if (tile !== null){
+        draw_tile_cell(tile, x, y, value);
+    }
+}
+
+function draw_tile_cell(tile, x, y, value) {
+    var context = tile.canvas.getContext('2d');
+    var top = (x - tile.x) * CELL_PIXELS;
+    var left = (y - tile.y) * CELL_PIXELS;
+    tile.values[(x - tile.x) * tile.height + (y - tile.y)] = value;
+
+    var label = '';
+    if (value === null){
+        context.fillStyle = '#0288D1';
+    } else if (value == 'flagged' || value == 'mined'){
+        context.fillStyle = '#FFCCCB';
+        label = value == 'flagged' ? 'F' : '*';
+    } else {
+        context.fillStyle = '#B3E5FC';
+        label = value === 0 ? '' : String(value);
+    }
+    context.fillRect(left, top, CELL_PIXELS - 1, CELL_PIXELS - 1);
+    if (label !== ''){
+        context.fillStyle = value == 'flagged' || value == 'mined' ? '#DA5552' : '#000000';
+        context.font = 'bold 14px sans-serif';
+        context.textAlign = 'center';
+        context.textBaseline = 'middle';
+        context.fillText(label, left + CELL_PIXELS / 2, top + CELL_PIXELS / 2);
+    }
+}
@@ -1,31 +1,123 @@
+import json
 from random import randint
 
 from braces.views import AjaxResponseMixin, JSONResponseMixin
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
 from django.views.generic import View
 
-from minesweeper.constants import WON, LOST, SUCCESS_MESSAGES, FAILURE_MESSAGES
+from minesweeper.conditional import conditional_board
+from minesweeper.constants import (
+    IN_PROGRESS, WON, LOST, SUCCESS_MESSAGES, FAILURE_MESSAGES, MOVE_TYPES, MAX_BATCH_MOVES,
+    TILE_SIZE, MAX_MOVE_CHANGES
+)
+from minesweeper.encoding import JSON, BASE64, RLE, BINARY, TILES, encode_public_codes
+from minesweeper.instrumentation import timed
 from minesweeper.models import MinesweeperGame
+from minesweeper.state_cache import game_for_update, get_game, get_tile
 
 
-class AjaxResetGame(JSONResponseMixin, AjaxResponseMixin, View):
+def get_board_encoding(request, encodings=(JSON, BASE64, RLE, TILES)):
+    """ Returns the board encoding requested by the client, defaulting to JSON.
+    """
+    data = request.POST if request.method == 'POST' else request.GET
+    encoding = data.get('encoding', JSON)
+    return encoding if encoding in encodings else JSON
+
+
+def get_status_message(game):
+    """ Returns a random message for a game that has been won or lost, or None.
+    """
+    if game.status == WON:
+        return SUCCESS_MESSAGES[randint(0, len(SUCCESS_MESSAGES) - 1)]
+    elif game.status == LOST:
+        return FAILURE_MESSAGES[randint(0, len(FAILURE_MESSAGES) - 1)]
+
+
+def get_boardstate_context(game, encoding=JSON):
+    """ Returns the full boardstate of a game as sent to clients, in the provided encoding.
+        Clients that load the board in tiles ask for the tiles encoding, which leaves the
+        board out.
+    """
+    context = {
+        'encoding': encoding,
+        'board_size': game.board_size,
+        'game_status': game.status,
+        'version': game.version,
+    }
+    if encoding != TILES:
+        context['json_boardstate'] = game.get_client_json_boardstate(encoding)
+    return context
+
+
+def get_move_context(game, base_version):
+    """ Returns the changes made to a game since it was loaded at base_version, as sent to
+        clients after a move.  If the move changed more than MAX_MOVE_CHANGES cells the
+        changes are None, and the client should reload the board instead.
+    """
+    too_many = len(game.board.changed_indexes()) > MAX_MOVE_CHANGES
+    return {
+        'changes': None if too_many else game.get_boardstate_changes(),
+        'base_version': base_version,
+        'version': game.version,
+        'message': get_status_message(game),
+        'game_status': game.status,
+    }
+
+
+def clean_moves(moves, board_size):
+    """ Checks a list of [x, y, move_type] moves.  Returns a list of (x, y, move_type)
+        tuples, or None if the list is invalid, too long or has a move off the board.
+    """
+    try:
+        moves = [(int(x), int(y), move_type) for x, y, move_type in moves]
+    except (TypeError, ValueError):
+        return None
+    if len(moves) > MAX_BATCH_MOVES:
+        return None
+    for x, y, move_type in moves:
+        if not (0 <= x < board_size and 0 <= y < board_size) or move_type not in MOVE_TYPES:
+            return None
+    return moves
+
+
+def parse_moves(data, board_size):
+    """ Parses a JSON list of [x, y, move_type] moves, see clean_moves.
+    """
+    try:
+        return clean_moves(json.loads(data), board_size)
+    except ValueError:
+        return None
+
+
+class TimedJSONResponseMixin(JSONResponseMixin):
+    """ Times the serialization of our JSON responses, see minesweeper.instrumentation.
+    """
+
+    def render_json_response(self, context_dict, status=200):
+        with timed('serialize'):
+            return super(TimedJSONResponseMixin, self).render_json_response(context_dict, status)
+
+
+class AjaxResetGame(TimedJSONResponseMixin, AjaxResponseMixin, View):
     """ Resets the game for the provided ID
     """
 
-    def get_ajax(self, request, *args, **kwargs):
+    http_method_names = ['post']
+
+    def post_ajax(self, request, *args, **kwargs):
         context = {}
         # Get our Dossier Object
-        game_id = request.GET.get('game_id', None)
+        game_id = request.POST.get('game_id', None)
 
         try:
-            game = MinesweeperGame.objects.prefetch_related('fields').get(id=game_id)
+            with game_for_update(game_id) as game:
+                game.reset()
         except MinesweeperGame.DoesNotExist:
             game = None
 
         if game:
-            game.reset()
-            json_boardstate = game.get_client_json_boardstate()
-            context['json_boardstate'] = json_boardstate
-            context['game_status'] = game.status
+            context.update(get_boardstate_context(game, get_board_encoding(request)))
         else:
             context['message'] = 'Game with ID {} not found'.format(game_id)
             context['message_class'] = 'alert alert-danger'
@@ -33,32 +125,156 @@ class AjaxResetGame(JSONResponseMixin, AjaxResponseMixin, View):
         return self.render_json_response(context)
 
 
-class AjaxProcessMove(JSONResponseMixin, AjaxResponseMixin, View):
-    """ Accepts a User move, processes it and returns the updated boardstate.
+class AjaxBoardState(TimedJSONResponseMixin, AjaxResponseMixin, View):
+    """ Returns the full boardstate for the provided ID.  Used by clients to resync when
+        the changes they were sent do not apply to the board they have.  With the binary
+        encoding the response body is the raw board, one byte per cell.  Clients that
+        already have the current version are answered with 304 Not Modified.
     """
 
+    @method_decorator(conditional_board)
     def get_ajax(self, request, *args, **kwargs):
         context = {}
-        # Get our Dossier Object
         game_id = request.GET.get('game_id', None)
-        move_type = request.GET.get('move_type', 'clear')
-        x = request.GET.get('x', None)
-        y = request.GET.get('y', None)
 
         try:
-            game = MinesweeperGame.objects.prefetch_related('fields').get(id=game_id)
+            game = get_game(game_id)
         except MinesweeperGame.DoesNotExist:
             game = None
 
-        if game and x and y:
-            game.user_move(int(x), int(y), move_type)
-            json_boardstate = game.get_client_json_boardstate()
-            context['json_boardstate'] = json_boardstate
-            if game.status == WON:
-                context['message'] = SUCCESS_MESSAGES[randint(0, len(SUCCESS_MESSAGES) - 1)]
-            elif game.status == LOST:
-                context['message'] = FAILURE_MESSAGES[randint(0, len(FAILURE_MESSAGES) - 1)]
+        encoding = get_board_encoding(request, encodings=(JSON, BASE64, RLE, BINARY))
+        if game and encoding == BINARY:
+            response = HttpResponse(
+                game.get_client_json_boardstate(encoding),
+                content_type='application/octet-stream'
+            )
+            response['X-Board-Size'] = game.board_size
+            response['X-Game-Status'] = game.status
+            response['X-Board-Version'] = game.version
+            return response
+
+        if game:
+            context.update(get_boardstate_context(game, encoding))
+        else:
+            context['message'] = 'Game with ID {} not found'.format(game_id)
+
+        return self.render_json_response(context)
+
+
+class AjaxBoardTile(TimedJSONResponseMixin, AjaxResponseMixin, View):
+    """ Returns one TILE_SIZE x TILE_SIZE tile of the board for the provided ID, so that
+        clients can load large boards a viewport at a time.  tile_x and tile_y count
+        tiles, not cells.  The tile is sent as run-length encoded public codes, x-major
+        like the full board, and is height cells wide and width rows long, which is
+        less than TILE_SIZE at the edges of the board.
+    """
+
+    @method_decorator(conditional_board)
+    def get_ajax(self, request, *args, **kwargs):
+        context = {}
+        game_id = request.GET.get('game_id', None)
+
+        try:
+            tile_x = max(0, int(request.GET.get('tile_x', 0)))
+            tile_y = max(0, int(request.GET.get('tile_y', 0)))
+        except ValueError:
+            tile_x = tile_y = 0
+        x, y = tile_x * TILE_SIZE, tile_y * TILE_SIZE
+
+        try:
+            game, cells = get_tile(game_id, x, y, TILE_SIZE, TILE_SIZE)
+        except MinesweeperGame.DoesNotExist:
+            game = None
+
+        if game:
+            width = max(0, min(TILE_SIZE, game.board_size - x))
+            context['tile'] = encode_public_codes(
+                cells, RLE, revealed=game.status != IN_PROGRESS
+            )
+            context['encoding'] = RLE
+            context['tile_x'] = tile_x
+            context['tile_y'] = tile_y
+            context['x'] = x
+            context['y'] = y
+            context['width'] = width
+            context['height'] = len(cells) // width if width else 0
+            context['board_size'] = game.board_size
             context['game_status'] = game.status
+            context['version'] = game.version
+        else:
+            context['message'] = 'Game with ID {} not found'.format(game_id)
+
+        return self.render_json_response(context)
+
+
+class AjaxProcessMove(TimedJSONResponseMixin, AjaxResponseMixin, View):
+    """ Accepts a User move, processes it and returns the squares that changed.  The
+        changes apply to the board at base_version and bring it to version; a client
+        holding any other version should fetch the full board instead.
+    """
+
+    http_method_names = ['post']
+
+    def post_ajax(self, request, *args, **kwargs):
+        context = {}
+        # Get our Dossier Object
+        game_id = request.POST.get('game_id', None)
+        move_type = request.POST.get('move_type', 'clear')
+        x = request.POST.get('x', None)
+        y = request.POST.get('y', None)
+
+        try:
+            with game_for_update(game_id) as game:
+                base_version = game.version
+                moves = clean_moves([[x, y, move_type]], game.board_size)
+                if moves is not None:
+                    game.user_move(*moves[0])
+        except MinesweeperGame.DoesNotExist:
+            game = None
+            moves = None
+
+        if game and moves is not None:
+            context.update(get_move_context(game, base_version))
+        elif game:
+            context['message'] = 'Send x, y and one of {} as move_type'.format(
+                ', '.join(MOVE_TYPES)
+            )
+        else:
+            context['message'] = 'Game with ID {} not found'.format(game_id)
+
+        return self.render_json_response(context)
+
+
+class AjaxProcessMoves(TimedJSONResponseMixin, AjaxResponseMixin, View):
+    """ Accepts an ordered list of moves as JSON, for example
+        moves=[[3, 4, "clear"], [2, 2, "flag"], [3, 3, "chord"]], and applies them in one
+        transaction on a single load of the game.  Returns the combined changes of every
+        move, like AjaxProcessMove, and the number of moves applied, which is less than
+        the number sent if a move ended the game.
+    """
+
+    http_method_names = ['post']
+
+    def post_ajax(self, request, *args, **kwargs):
+        context = {}
+        game_id = request.POST.get('game_id', None)
+
+        try:
+            with game_for_update(game_id) as game:
+                base_version = game.version
+                moves = parse_moves(request.POST.get('moves', '[]'), game.board_size)
+                if moves is not None:
+                    context['moves_applied'] = game.user_moves(moves)
+        except MinesweeperGame.DoesNotExist:
+            game = None
+            moves = None
+
+        if game and moves is not None:
+            context.update(get_move_context(game, base_version))
+        elif game:
+            context['message'] = 'Send a list of at most {} [x, y, move_type] moves'.format(
+                MAX_BATCH_MOVES
+            )
         else:
             context['message'] = 'Game with ID {} not found'.format(game_id)
 
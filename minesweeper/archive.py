@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from minesweeper.models import MinesweeperGame, Turn
+from minesweeper.replay import pack_moves, turn_moves
+from minesweeper.state_cache import uncached_game
+
+
+def archivable_games(cutoff):
+    """ Returns the games that have not been archived and have not changed since cutoff:
+        games that were won or lost and games that were abandoned in progress.
+    """
+    return MinesweeperGame.objects.filter(archived=None).filter(
+        Q(updated__lt=cutoff) | Q(updated=None, created__lt=cutoff)
+    )
+
+
+def archive_game(game_id, cutoff):
+    """ Packs every move of the game with the provided ID into its move_log and marks it
+        archived, unless it has been archived or played since cutoff.  The board itself
+        is already packed into the game row.  The turns of the game are left in place
+        for delete_archived_turns.  The game row is locked while it is archived, and a
+        game kept in the state cache is flushed and dropped from it first, without
+        loading idle games into the cache.  Returns True if the game was archived.
+    """
+    with uncached_game(game_id), transaction.atomic():
+        game = MinesweeperGame.objects.lock(game_id)
+        if game.archived is not None or (game.updated or game.created) >= cutoff:
+            return False
+        game.move_log = pack_moves(turn_moves(game), game.board_size)
+        game.archived = timezone.now()
+        game.save(update_fields=['move_log', 'archived'])
+    return True
+
+
+def delete_archived_turns(batch_size=1000, pause=0):
+    """ Deletes the turns of archived games, batch_size turns per query and sleeping pause
+        seconds between queries so that the database is never busy for long.  Returns the
+        number of turns deleted.
+    """
+    deleted = 0
+    while True:
+        turns = Turn.objects.filter(game__archived__isnull=False)
+        turn_ids = list(turns.values_list('id', flat=True)[:batch_size])
+        if not turn_ids:
+            return deleted
+        Turn.objects.filter(id__in=turn_ids).delete()
+        deleted += len(turn_ids)
+        time.sleep(pause)
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import multiprocessing
+import random
+import time
+
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from minesweeper.board import VISIBLE, Board
+from minesweeper.constants import IN_PROGRESS
+from minesweeper.instrumentation import QueryRecorder
+from minesweeper.models import MinesweeperGame
+from minesweeper.solver import DEFAULT_BUDGET, is_solvable, search_no_guess_seed
+from minesweeper.state_cache import game_for_update
+
+SIZES = (10, 30, 100)
+MINE_DENSITY = 0.15
+
+
+class Rollback(Exception):
+    """ Raised to roll back the games a benchmark round created.
+    """
+
+
+def percentile(values, percent):
+    """ Returns the value below which the provided percentage of values fall.
+    """
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))]
+
+
+class OperationStats(object):
+    """ The measurements taken for one operation on one board size.
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.timings = []
+        self.queries = []
+        self.rows_written = []
+
+    @property
+    def key(self):
+        return '{}@{}'.format(self.name, self.size)
+
+    def add(self, duration, recorder):
+        self.timings.append(duration)
+        self.queries.append(recorder.queries)
+        self.rows_written.append(recorder.rows_written)
+
+    def summary(self):
+        count = len(self.timings) or 1
+        return {
+            'operation': self.name,
+            'size': self.size,
+            'count': len(self.timings),
+            'queries': max(self.queries or [0]),
+            'rows_written': sum(self.rows_written) / float(count),
+            'p50_ms': percentile(self.timings, 50) * 1000,
+            'p99_ms': percentile(self.timings, 99) * 1000,
+        }
+
+
+class MoveBenchmark(object):
+    """ Replays seeded move sequences against new games of each board size and measures
+        every operation: starting a game, clearing open areas, storms of flags, chains of
+        undos, resets and single and batched moves through the AJAX views.  Every round
+        runs in a transaction that is rolled back, so the benchmark leaves the database as
+        it found it.
+    """
+
+    def __init__(self, sizes=SIZES, rounds=3, seed=0):
+        self.sizes = sizes
+        self.rounds = rounds
+        self.seed = seed
+        self.stats = {}
+
+    def measure(self, name, size, func, *args):
+        stats = self.stats.get((name, size))
+        if stats is None:
+            stats = self.stats[(name, size)] = OperationStats(name, size)
+        with QueryRecorder() as recorder:
+            start = time.time()
+            result = func(*args)
+            stats.add(time.time() - start, recorder)
+        return result
+
+    def run(self):
+        for size in self.sizes:
+            for number in range(self.rounds):
+                random.seed('{}-{}-{}'.format(self.seed, size, number))
+                try:
+                    with transaction.atomic():
+                        self.play(size)
+                        raise Rollback()
+                except Rollback:
+                    pass
+        return [self.stats[key].summary() for key in sorted(self.stats)]
+
+    def move(self, game_id, x, y, move_type='clear'):
+        with game_for_update(game_id) as game:
+            game.user_move(x, y, move_type)
+        return game
+
+    def hidden_cells(self, game):
+        board = game.board
+        return [
+            board.coordinates(index) for index in range(len(board))
+            if not board.cells[index] & VISIBLE
+        ]
+
+    def safe_cells(self, game):
+        return [(x, y) for x, y in self.hidden_cells(game) if not game.board.is_mined(x, y)]
+
+    def play(self, size):
+        num_mines = max(1, int(size * size * MINE_DENSITY))
+        game = MinesweeperGame.objects.create(board_size=size, num_mines=num_mines)
+        self.measure('start', size, game.start)
+
+        # Open areas: the first clear opens the middle of the board, the rest clear
+        # hidden cells that do not contain a mine
+        game = self.measure('clear', size, self.move, game.id, size // 2, size // 2)
+        for move in range(10):
+            safe = self.safe_cells(game)
+            if not safe or game.status != IN_PROGRESS:
+                break
+            x, y = random.choice(safe)
+            game = self.measure('clear', size, self.move, game.id, x, y)
+
+        # Flag storm
+        hidden = self.hidden_cells(game)
+        for x, y in random.sample(hidden, min(len(hidden), 20)):
+            game = self.measure('flag', size, self.move, game.id, x, y, 'flag')
+
+        # Undo chain
+        for move in range(20):
+            game = self.measure('undo', size, self.move, game.id, 0, 0, 'undo')
+
+        with game_for_update(game.id) as game:
+            self.measure('reset', size, game.reset)
+
+        # Moves through the views clear cells without a mine, so that every board size
+        # plays the same moves on a game in progress
+        client = Client(HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        url = reverse('ajax_submit_move')
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for x, y in random.sample(self.safe_cells(game), min(len(self.safe_cells(game)), 10)):
+                response = self.measure('ajax_move', size, client.post, url, {
+                    'game_id': game.id, 'x': x, 'y': y, 'move_type': 'clear'
+                })
+                if json.loads(response.content.decode('utf-8'))['game_status'] != IN_PROGRESS:
+                    break
+
+            with game_for_update(game.id) as game:
+                game.reset()
+            safe = self.safe_cells(game)
+            moves = [
+                [x, y, random.choice(['clear', 'flag', 'chord'])]
+                for x, y in random.sample(safe, min(len(safe), 10))
+            ]
+            self.measure('ajax_batch', size, client.post, reverse('ajax_submit_moves'), {
+                'game_id': game.id, 'moves': json.dumps(moves)
+            })
+
+
+def solve_boards(args):
+    """ Generates and solves the boards for the provided seeds, from a first clear in the
+        middle of the board.  Returns the number that could be solved without guessing.
+        Takes a single tuple so that it can be mapped over a process pool.
+    """
+    size, num_mines, seeds = args
+    safe_index = (size // 2) * size + size // 2
+    solvable = 0
+    for seed in seeds:
+        board = Board(size)
+        board.generate_mines(num_mines, safe_index, random.Random(seed))
+        solvable += is_solvable(board, safe_index)
+    return solvable
+
+
+class SolverBenchmark(object):
+    """ Measures how many boards per second minesweeper.solver can check, and how long
+        no-guess generation takes, for each board size and mine density.  With more than
+        one process the boards are solved in a process pool, as when generating boards in
+        bulk.  No-guess generation gives up after budget seconds, as it does when a game
+        is started, and the share of boards it gave up on is reported as failed.
+    """
+
+    def __init__(self, sizes=SIZES, densities=(0.12, MINE_DENSITY, 0.2), boards=100,
+                 processes=1, seed=0, budget=DEFAULT_BUDGET, generations=10):
+        self.sizes = sizes
+        self.densities = densities
+        self.boards = boards
+        self.processes = processes
+        self.seed = seed
+        self.budget = budget
+        self.generations = generations
+
+    def run(self):
+        pool = multiprocessing.Pool(self.processes) if self.processes > 1 else None
+        results = []
+        try:
+            for size in self.sizes:
+                for density in self.densities:
+                    results.append(self.measure(size, density, pool))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return results
+
+    def measure(self, size, density, pool):
+        num_mines = max(1, int(size * size * density))
+        seeds = list(range(self.seed, self.seed + self.boards))
+        chunks = [
+            (size, num_mines, seeds[start::self.processes]) for start in range(self.processes)
+        ]
+
+        start = time.time()
+        solvable = sum(pool.map(solve_boards, chunks) if pool else map(solve_boards, chunks))
+        duration = time.time() - start
+
+        # No-guess generation of a few boards, within the time budget
+        safe_index = (size // 2) * size + size // 2
+        timings = []
+        failed = 0
+        for seed in seeds[:self.generations]:
+            generation_start = time.time()
+            seed, solvable = search_no_guess_seed(
+                size, num_mines, safe_index, seed, budget=self.budget
+            )
+            timings.append(time.time() - generation_start)
+            failed += not solvable
+
+        return {
+            'size': size,
+            'density': density,
+            'boards': self.boards,
+            'solvable': solvable / float(self.boards),
+            'boards_per_second': self.boards / duration if duration else 0,
+            'no_guess_p50_ms': percentile(timings, 50) * 1000,
+            'no_guess_p99_ms': percentile(timings, 99) * 1000,
+            'no_guess_failed': failed / float(len(timings)) if timings else 0,
+        }
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import binascii
+import itertools
+import random
+import struct
+import zlib
+from collections import deque
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Each cell of the board is packed into a single byte.  The low nibble holds the number
+# of adjacent mines and the high bits hold the state of the cell.
+VALUE_MASK = 0x0F
+MINED = 0x10
+VISIBLE = 0x20
+FLAGGED = 0x40
+STATE_MASK = VISIBLE | FLAGGED
+
+# Public codes for a cell, used by the compact board encodings.  Values 0-8 are the
+# number of adjacent mines of a visible cell.
+HIDDEN_CODE = 9
+FLAGGED_CODE = 10
+MINED_CODE = 11
+
+
+def public_code(cell):
+    """ Returns the public code of a packed cell, matching Board.visible_value.
+    """
+    if cell & VISIBLE:
+        if cell & MINED:
+            return MINED_CODE
+        elif cell & FLAGGED:
+            return FLAGGED_CODE
+        else:
+            return cell & VALUE_MASK
+    else:
+        return FLAGGED_CODE if cell & FLAGGED else HIDDEN_CODE
+
+
+# Translation table from every possible packed cell to its public code
+PUBLIC_CODES = bytes(bytearray(public_code(cell) for cell in range(256)))
+
+# The same once the game is over, when every cell is shown (see Board.revealed)
+REVEALED_CODES = bytes(bytearray(public_code(cell | VISIBLE) for cell in range(256)))
+
+# Translation tables that turn the cells we want to count into 1s, so that they can be
+# counted without looping over the board in Python
+FLAGGED_CELLS = bytes(bytearray(1 if cell & FLAGGED else 0 for cell in range(256)))
+HIDDEN_SAFE_CELLS = bytes(bytearray(0 if cell & (VISIBLE | MINED) else 1 for cell in range(256)))
+
+# Translation tables that hide every cell and that keep only the state of every cell, so
+# that a whole board can be reset and its states saved without a Python loop
+HIDDEN_CELLS = bytes(bytearray(cell & ~STATE_MASK for cell in range(256)))
+CELL_STATES = bytes(bytearray(cell & STATE_MASK for cell in range(256)))
+
+ADJACENT_OFFSETS = [
+    (x_offset, y_offset)
+    for x_offset, y_offset in itertools.product(range(-1, 2), range(-1, 2))
+    if x_offset or y_offset
+]
+
+
+class Board(object):
+    """ An in-memory minesweeper board.  The board is stored as a flat bytearray holding
+        one packed byte per cell, indexed by x * size + y, so that the whole board can be
+        loaded from and written back to a single database column.  The indexes of the
+        cells changed since the board was loaded are kept in changed so that only those
+        are sent back to the player, and the state each cell had before the current move
+        is kept in previous_states so that the move can be undone.  The number of flagged
+        cells and of hidden cells without a mine are kept up to date as cells change, so
+        that the flag limit and the win condition can be checked without a scan.  A reset
+        changes every cell at once, so it keeps a snapshot of the state of every cell
+        instead of previous_states, and marks every cell as changed.
+
+        Once the game is over every cell is shown.  Rather than marking every cell as
+        visible, which on a large board would cost a write and an undo record per cell,
+        the board is flagged as revealed and the public values are worked out as if every
+        cell were visible.
+    """
+
+    def __init__(self, size, cells=None, flags=None, hidden_safe_cells=None, revealed=False):
+        self.size = size
+        self.revealed = self.loaded_revealed = revealed
+        if cells is None:
+            self.cells = bytearray(size * size)
+        else:
+            self.cells = bytearray(cells)
+        self.changed = set()
+        self.changed_all = False
+        self.previous_states = {}
+        self.snapshot = None
+        if flags is None or hidden_safe_cells is None:
+            self.count_cells()
+        else:
+            self.flags = flags
+            self.hidden_safe_cells = hidden_safe_cells
+
+    def __len__(self):
+        return len(self.cells)
+
+    def to_bytes(self):
+        """ Returns the packed board so that it can be stored.
+        """
+        return bytes(self.cells)
+
+    def index(self, x, y):
+        """ Returns the position of the cell at x, y in our flat array.
+        """
+        return x * self.size + y
+
+    def coordinates(self, index):
+        """ Returns the x and y coordinates of the cell at the provided index.
+        """
+        return divmod(index, self.size)
+
+    def adjacent_indexes(self, index):
+        """ Returns a list of the indexes of the cells adjacent to the provided index.
+            The cell itself is not included.
+        """
+        x, y = self.coordinates(index)
+        adjacent = []
+        for x_offset, y_offset in ADJACENT_OFFSETS:
+            adjacent_x, adjacent_y = x + x_offset, y + y_offset
+            if 0 <= adjacent_x < self.size and 0 <= adjacent_y < self.size:
+                adjacent.append(adjacent_x * self.size + adjacent_y)
+        return adjacent
+
+    def is_mined(self, x, y):
+        return bool(self.cells[self.index(x, y)] & MINED)
+
+    def is_visible(self, x, y):
+        return bool(self.cells[self.index(x, y)] & VISIBLE)
+
+    def is_flagged(self, x, y):
+        return bool(self.cells[self.index(x, y)] & FLAGGED)
+
+    def value(self, x, y):
+        return self.cells[self.index(x, y)] & VALUE_MASK
+
+    def count_cells(self):
+        """ Counts the flagged cells and the hidden cells without a mine.
+        """
+        self.flags = self.cells.translate(FLAGGED_CELLS).count(b'\x01')
+        self.hidden_safe_cells = self.cells.translate(HIDDEN_SAFE_CELLS).count(b'\x01')
+
+    def check_counts(self):
+        """ Recounts the cells and raises an AssertionError if the counts kept on the
+            board do not match.
+        """
+        flags, hidden_safe_cells = self.flags, self.hidden_safe_cells
+        self.count_cells()
+        if (flags, hidden_safe_cells) != (self.flags, self.hidden_safe_cells):
+            raise AssertionError(
+                'Board counts out of date: {} flags and {} hidden safe cells, expected {} '
+                'and {}'.format(flags, hidden_safe_cells, self.flags, self.hidden_safe_cells)
+            )
+
+    def flag_count(self):
+        """ Returns an integer representing the total number of flagged cells
+        """
+        return self.flags
+
+    def all_safe_cells_visible(self):
+        """ Returns True if every cell that does not contain a mine is visible.
+        """
+        return self.hidden_safe_cells == 0
+
+    def generate_mines(self, num_mines, safe_index=None, rng=random):
+        """ Places the provided number of mines on a board without mines and sets the
+            value of every cell to the number of adjacent mines.  Mine positions are
+            sampled without replacement, so no position is ever drawn twice.  If
+            safe_index is provided, no mine is placed on that cell or, if there is room
+            for the mines elsewhere, next to it.  Pass a seeded random.Random as rng to
+            place the same mines every time.
+        """
+        candidates = range(len(self.cells))
+        if safe_index is not None:
+            excluded = set(self.adjacent_indexes(safe_index))
+            if num_mines > len(self.cells) - len(excluded) - 1:
+                excluded = set()
+            excluded.add(safe_index)
+            candidates = [index for index in candidates if index not in excluded]
+        mines = rng.sample(candidates, num_mines)
+        if numpy is not None:
+            self.count_adjacent_mines(mines)
+        else:
+            for index in mines:
+                self.cells[index] |= MINED
+                for adjacent_index in self.adjacent_indexes(index):
+                    self.cells[adjacent_index] += 1
+        self.count_cells()
+
+    def count_adjacent_mines(self, mines):
+        """ Places the mines at the provided indexes using NumPy.  The adjacent mine
+            counts are a 2D convolution of the mine grid with a 3x3 kernel, computed here
+            as the sum of the eight shifted copies of the zero padded grid.
+        """
+        size = self.size
+        mined = numpy.zeros(size * size, dtype=numpy.uint8)
+        mined[mines] = 1
+        padded = numpy.pad(mined.reshape(size, size), 1, 'constant')
+        counts = numpy.zeros((size, size), dtype=numpy.uint8)
+        for x_offset, y_offset in ADJACENT_OFFSETS:
+            counts += padded[1 + x_offset:1 + x_offset + size, 1 + y_offset:1 + y_offset + size]
+        counts |= padded[1:-1, 1:-1] * MINED
+        counts |= numpy.frombuffer(self.cells, dtype=numpy.uint8).reshape(size, size)
+        self.cells = bytearray(counts.tobytes())
+
+    def start_move(self):
+        """ Forgets the previous states recorded for the last move.
+        """
+        self.previous_states = {}
+        self.snapshot = None
+
+    def update_cell(self, index, cell):
+        """ Sets the packed cell at index, recording the change and keeping the counts up
+            to date.
+        """
+        previous = self.cells[index]
+        if cell == previous:
+            return
+        self.changed.add(index)
+        if index not in self.previous_states:
+            self.previous_states[index] = previous & STATE_MASK
+        self.cells[index] = cell
+        self.flags += bool(cell & FLAGGED) - bool(previous & FLAGGED)
+        if not cell & MINED:
+            self.hidden_safe_cells += bool(previous & VISIBLE) - bool(cell & VISIBLE)
+
+    def set_flag(self, x, y, flagged):
+        index = self.index(x, y)
+        if flagged:
+            self.update_cell(index, self.cells[index] | FLAGGED)
+        else:
+            self.update_cell(index, self.cells[index] & ~FLAGGED)
+
+    def toggle_flag(self, x, y):
+        self.set_flag(x, y, not self.is_flagged(x, y))
+
+    def make_visible(self, x, y):
+        """ Marks the cell at x, y as visible.  If the value of the cell is 0, also
+            clears the adjacent cells.
+        """
+        index = self.index(x, y)
+        self.update_cell(index, self.cells[index] | VISIBLE)
+        if not self.cells[index] & VALUE_MASK:
+            self.make_visible_adjacent(index)
+
+    def make_visible_adjacent(self, index):
+        """ Marks adjacent cells as visible if they are neither visible nor mined, and
+            keeps clearing outwards from every newly visible cell with a value of 0.  The
+            region is walked breadth first from a queue, so its size is not limited by the
+            recursion limit.
+        """
+        queue = deque([index])
+        while queue:
+            for adjacent_index in self.adjacent_indexes(queue.popleft()):
+                cell = self.cells[adjacent_index]
+                if not cell & (VISIBLE | MINED):
+                    self.update_cell(adjacent_index, (cell | VISIBLE) & ~FLAGGED)
+                    if not cell & VALUE_MASK:
+                        queue.append(adjacent_index)
+
+    def chord_indexes(self, x, y):
+        """ Returns the indexes of the cells a chord on the cell at x, y clears: the hidden,
+            unflagged cells around it, if it is visible and as many of the cells around it
+            are flagged as it has adjacent mines.  Otherwise returns an empty list.
+        """
+        index = self.index(x, y)
+        cell = self.cells[index]
+        if not cell & VISIBLE or cell & (MINED | FLAGGED):
+            return []
+        adjacent = self.adjacent_indexes(index)
+        flags = sum(1 for adjacent_index in adjacent if self.cells[adjacent_index] & FLAGGED)
+        if flags != cell & VALUE_MASK:
+            return []
+        return [
+            adjacent_index for adjacent_index in adjacent
+            if not self.cells[adjacent_index] & (VISIBLE | FLAGGED)
+        ]
+
+    def restore(self, previous_states):
+        """ Puts the cells back into the states recorded in previous_states, a dict of
+            index to state, which undoes the move those states were recorded for.
+        """
+        for index, state in previous_states.items():
+            self.update_cell(index, (self.cells[index] & ~STATE_MASK) | state)
+
+    def reveal_all(self):
+        """ Shows every cell on the board, without changing the cells themselves.
+        """
+        self.revealed = True
+
+    def reset(self):
+        """ Hides and unflags every cell on the board, keeping the mines where they are.
+            The cells are changed in bulk, and the state each cell had is kept in
+            snapshot, one byte per cell, so that the reset can be undone.
+        """
+        self.revealed = False
+        states = bytes(self.cells.translate(CELL_STATES))
+        if states.count(b'\x00') == len(states):
+            return
+        self.snapshot = states
+        self.cells = self.cells.translate(HIDDEN_CELLS)
+        self.changed_all = True
+        self.count_cells()
+
+    def restore_snapshot(self, snapshot):
+        """ Puts every cell back into its state in snapshot, which undoes the reset that
+            saved it.  The hidden cells and the snapshot are read as two big integers and
+            combined with a single OR, so that no cell is visited in Python.
+        """
+        if not snapshot:
+            return
+        cells = int(binascii.hexlify(bytes(self.cells.translate(HIDDEN_CELLS))), 16)
+        states = int(binascii.hexlify(bytes(snapshot)), 16)
+        self.cells = bytearray(binascii.unhexlify(
+            '{:0{}x}'.format(cells | states, 2 * len(self.cells)).encode('ascii')
+        ))
+        self.changed_all = True
+        self.count_cells()
+
+    def visible_value(self, x, y):
+        """ Returns the value we want to provide for this cell for the user.  Should
+            be as follows:  If it's visible, we should return 'mined' if it is mined,
+            otherwise it's value.  If it's not visible, we should return 'flagged' if
+            it's flagged, and otherwise None.
+        """
+        cell = self.cells[self.index(x, y)]
+        if self.revealed:
+            cell |= VISIBLE
+        if cell & VISIBLE:
+            if cell & MINED:
+                return 'mined'
+            elif cell & FLAGGED:
+                return 'flagged'
+            else:
+                return cell & VALUE_MASK
+        else:
+            return 'flagged' if cell & FLAGGED else None
+
+    def public_bytes(self):
+        """ Returns the public boardstate as one byte per cell (see public_code), in the
+            same order as the board.
+        """
+        return bytes(self.cells.translate(REVEALED_CODES if self.revealed else PUBLIC_CODES))
+
+    def tile(self, x, y, width, height):
+        """ Returns the packed cells of the width x height tile whose first cell is at x, y,
+            in the same order as the board, clipped to the edges of the board.
+        """
+        height = max(0, min(height, self.size - y))
+        cells = bytearray()
+        for row in range(x, min(x + width, self.size)):
+            start = self.index(row, y)
+            cells += self.cells[start:start + height]
+        return bytes(cells)
+
+    def visible_boardstate(self):
+        """ Returns a 2D array with all publicly available information.
+        """
+        return [[self.visible_value(x, y) for y in range(self.size)] for x in range(self.size)]
+
+    def changed_indexes(self):
+        """ Returns the indexes of the cells whose public value may have changed since the
+            board was loaded, which is every cell if the board was reset, revealed or
+            hidden again.
+        """
+        if self.changed_all or self.revealed != self.loaded_revealed:
+            return range(len(self.cells))
+        return sorted(self.changed)
+
+    def changes(self):
+        """ Returns a list of [x, y, value] for every cell changed since the board was
+            loaded, where value is the same public value get_visible_boardstate uses.
+        """
+        changes = []
+        for index in self.changed_indexes():
+            x, y = self.coordinates(index)
+            changes.append([x, y, self.visible_value(x, y)])
+        return changes
+
+
+def pack_states(states):
+    """ Packs a dict of cell index to cell state into bytes, four bytes per cell holding
+        the index in the upper 24 bits and the state in the lower 8.
+    """
+    values = [index << 8 | state for index, state in sorted(states.items())]
+    return struct.pack(str('<{}I').format(len(values)), *values)
+
+
+def unpack_states(data):
+    """ Unpacks bytes written by pack_states back into a dict of cell index to state.
+    """
+    data = bytes(data or b'')
+    values = struct.unpack(str('<{}I').format(len(data) // 4), data)
+    return dict((value >> 8, value & 0xFF) for value in values)
+
+
+def pack_snapshot(snapshot):
+    """ Compresses a snapshot of the state of every cell (see Board.reset), which is
+        mostly hidden cells, so that it can be stored.
+    """
+    return zlib.compress(snapshot) if snapshot else b''
+
+
+def unpack_snapshot(data):
+    """ Returns the snapshot packed by pack_snapshot.
+    """
+    data = bytes(data or b'')
+    return zlib.decompress(data) if data else b''
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from minesweeper.models import MinesweeperGame
+from minesweeper.state_cache import get_game_version
+
+
+def board_validators(request, game_id):
+    """ Returns a tuple of the ETag and the Last-Modified time of the board of the game
+        for the provided ID, or (None, None) if there is no such game.  The ETag is the
+        version of the game, which every change to the board bumps, so it is checked
+        without loading the board.  Kept on the request, as condition asks for each
+        separately.
+    """
+    if not hasattr(request, 'board_validators'):
+        try:
+            version, updated, archived = get_game_version(game_id)
+        except (MinesweeperGame.DoesNotExist, ValueError, TypeError):
+            request.board_validators = (None, None)
+        else:
+            # Archiving a game changes its page but not its board
+            etag = '{}-archived'.format(version) if archived else '{}'.format(version)
+            request.board_validators = (etag, updated)
+    return request.board_validators
+
+
+def requested_game_id(request, kwargs):
+    return kwargs.get('game_id') or request.GET.get('game_id')
+
+
+def board_etag(request, *args, **kwargs):
+    return board_validators(request, requested_game_id(request, kwargs))[0]
+
+
+def board_last_modified(request, *args, **kwargs):
+    return board_validators(request, requested_game_id(request, kwargs))[1]
+
+
+def conditional_board(view):
+    """ Decorates a view that reads the board of a game, taken from the game_id URL
+        argument or query parameter, so that it sends an ETag and a Last-Modified
+        header and answers requests for a board the client already has with 304 Not
+        Modified.  Clients are told to check with the server every time, so that they
+        never show a board that has changed.
+    """
+    view = condition(etag_func=board_etag, last_modified_func=board_last_modified)(view)
+    return cache_control(private=True, no_cache=True)(view)
+
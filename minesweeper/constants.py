@@ -3,6 +3,22 @@ IN_PROGRESS = 0
 WON = 1
 LOST = 2
 
+# Move types
+MOVE_TYPES = ('clear', 'flag', 'chord', 'undo')
+
+# Most moves accepted in a single batch
+MAX_BATCH_MOVES = 100
+
+# Board sizes.  Boards larger than LARGE_BOARD_SIZE are shown in tiles of TILE_SIZE x
+# TILE_SIZE cells that the client fetches as they scroll into view.
+MAX_BOARD_SIZE = 1000
+LARGE_BOARD_SIZE = 40
+TILE_SIZE = 32
+
+# Moves that change more cells than this tell the client to reload the board instead of
+# sending every change
+MAX_MOVE_CHANGES = 4096
+
 # Messages
 
 SUCCESS_MESSAGES = [
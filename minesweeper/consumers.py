@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from channels import Group
+from channels.generic.websockets import JsonWebsocketConsumer
+
+from minesweeper.ajax_views import clean_moves, get_boardstate_context, get_move_context
+from minesweeper.constants import MOVE_TYPES, MAX_BATCH_MOVES
+from minesweeper.encoding import JSON, BASE64, RLE, TILES
+from minesweeper.models import MinesweeperGame
+from minesweeper.state_cache import game_for_update
+
+
+class GameConsumer(JsonWebsocketConsumer):
+    """ A WebSocket for one game, so that a client can keep a single connection open
+        instead of making a request per move.  Clients send JSON messages:
+
+            {"action": "move", "x": 3, "y": 4, "move_type": "clear"}
+            {"action": "moves", "moves": [[3, 4, "clear"], [2, 2, "flag"]]}
+            {"action": "reset", "encoding": "rle"}
+
+        The changes made by a move are sent to every socket open on the game with the
+        action "changes", in the same format as the ajax_move view, and a reset sends
+        the full board with the action "boardstate".  Errors are only sent back to the
+        socket that caused them, with the action "error".
+    """
+
+    @classmethod
+    def group_name(cls, game_id):
+        return 'minesweeper-game-{}'.format(game_id)
+
+    def group(self, game_id):
+        return Group(self.group_name(game_id), channel_layer=self.message.channel_layer)
+
+    def connect(self, message, game_id=None, **kwargs):
+        """ Accepts the socket and adds it to the group of the game, or rejects it if
+            there is no such game, so rejected sockets never receive its changes.
+        """
+        accept = MinesweeperGame.objects.filter(id=game_id).exists()
+        if accept:
+            self.group(game_id).add(message.reply_channel)
+        message.reply_channel.send({'accept': accept})
+
+    def disconnect(self, message, game_id=None, **kwargs):
+        self.group(game_id).discard(message.reply_channel)
+
+    def receive(self, content, game_id=None, **kwargs):
+        action = content.get('action') if isinstance(content, dict) else None
+        try:
+            if action == 'move':
+                response = self.move(game_id, content)
+            elif action == 'moves':
+                response = self.moves(game_id, content)
+            elif action == 'reset':
+                response = self.reset(game_id, content)
+            else:
+                response = self.error('Unknown action {}'.format(action))
+        except MinesweeperGame.DoesNotExist:
+            response = self.error('Game with ID {} not found'.format(game_id))
+
+        if response['action'] == 'error':
+            self.send(response)
+        else:
+            self.group_send(self.group_name(game_id), response)
+
+    def error(self, message):
+        return {'action': 'error', 'message': message}
+
+    def move(self, game_id, content):
+        with game_for_update(game_id) as game:
+            base_version = game.version
+            moves = clean_moves(
+                [[content.get('x'), content.get('y'), content.get('move_type', 'clear')]],
+                game.board_size
+            )
+            if moves is None:
+                return self.error('Send x, y and one of {} as move_type'.format(
+                    ', '.join(MOVE_TYPES)
+                ))
+            game.user_move(*moves[0])
+
+        response = get_move_context(game, base_version)
+        response['action'] = 'changes'
+        return response
+
+    def moves(self, game_id, content):
+        with game_for_update(game_id) as game:
+            base_version = game.version
+            moves = clean_moves(content.get('moves'), game.board_size)
+            if moves is None:
+                return self.error('Send a list of at most {} [x, y, move_type] moves'.format(
+                    MAX_BATCH_MOVES
+                ))
+            applied = game.user_moves(moves)
+
+        response = get_move_context(game, base_version)
+        response['action'] = 'changes'
+        response['moves_applied'] = applied
+        return response
+
+    def reset(self, game_id, content):
+        with game_for_update(game_id) as game:
+            game.reset()
+
+        encoding = content.get('encoding', JSON)
+        if encoding not in (JSON, BASE64, RLE, TILES):
+            encoding = JSON
+        response = get_boardstate_context(game, encoding)
+        response['action'] = 'boardstate'
+        return response
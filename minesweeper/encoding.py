@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import base64
+import itertools
+import json
+
+from minesweeper.board import PUBLIC_CODES, REVEALED_CODES
+
+JSON = 'json'
+BASE64 = 'base64'
+RLE = 'rle'
+BINARY = 'binary'
+# The board is not sent at all, for clients that load it in tiles
+TILES = 'tiles'
+
+ENCODINGS = (JSON, BASE64, RLE, BINARY)
+
+
+def run_length_encode(data):
+    """ Run-length encodes a byte string as pairs of (run length, byte), with runs of
+        at most 255 bytes.
+    """
+    encoded = bytearray()
+    for code, run in itertools.groupby(bytearray(data)):
+        length = sum(1 for item in run)
+        while length > 0:
+            encoded.append(min(length, 255))
+            encoded.append(code)
+            length -= 255
+    return bytes(encoded)
+
+
+def encode_public_codes(cells, encoding=RLE, revealed=False):
+    """ Returns packed cells, for example a tile of a board, as public codes in the base64,
+        rle or binary encoding.  revealed shows every cell, as on the board of a game that
+        is over.
+    """
+    codes = bytes(cells).translate(REVEALED_CODES if revealed else PUBLIC_CODES)
+    if encoding == BASE64:
+        return base64.b64encode(codes).decode('ascii')
+    elif encoding == RLE:
+        return base64.b64encode(run_length_encode(codes)).decode('ascii')
+    elif encoding == BINARY:
+        return codes
+    raise ValueError('Unknown encoding {} for public codes'.format(encoding))
+
+
+def encode_boardstate(board, encoding=JSON):
+    """ Returns the public boardstate of the provided Board in the requested encoding:
+
+        json: a JSON 2D array, as returned by get_visible_boardstate
+        base64: one byte per cell, base64 encoded
+        rle: one byte per cell, run-length encoded and then base64 encoded
+        binary: one byte per cell as raw bytes
+
+        Cells are in x-major order and each byte is the public code of the cell: 0-8 for a
+        visible value, then HIDDEN_CODE, FLAGGED_CODE and MINED_CODE.
+    """
+    if encoding == JSON:
+        return json.dumps(board.visible_boardstate())
+    elif encoding in (BASE64, RLE, BINARY):
+        return encode_public_codes(board.cells, encoding, board.revealed)
+    raise ValueError('Unknown board encoding {}'.format(encoding))
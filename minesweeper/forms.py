@@ -1,5 +1,7 @@
 from django import forms
 
+from minesweeper.constants import MAX_BOARD_SIZE
+
 
 class NewGameForm(forms.Form):
 
@@ -9,5 +11,26 @@ class NewGameForm(forms.Form):
                 'class': 'form-control'
             }
         ),
-        initial=10
+        initial=10,
+        min_value=1
+    )
+    board_size = forms.IntegerField(
+        widget=forms.TextInput(
+            attrs={
+                'class': 'form-control'
+            }
+        ),
+        initial=10,
+        min_value=2,
+        max_value=MAX_BOARD_SIZE,
+        required=False
     )
+
+    def clean(self):
+        cleaned_data = super(NewGameForm, self).clean()
+        num_mines = cleaned_data.get('num_mines')
+        board_size = cleaned_data.get('board_size') or 10
+        if num_mines and num_mines >= board_size * board_size:
+            raise forms.ValidationError('There must be fewer mines than squares on the board.')
+        cleaned_data['board_size'] = board_size
+        return cleaned_data
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Statements that only manage transactions, which differ between database backends and
+# are not counted as queries
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class RecordingCursorWrapper(object):
+    """ Wraps a database cursor so that every statement it runs is reported to a
+        QueryRecorder.  Only used on Django versions without execute_wrapper.
+    """
+
+    def __init__(self, cursor, recorder):
+        self.cursor = cursor
+        self.recorder = recorder
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return self.cursor.__exit__(type, value, traceback)
+
+    def execute(self, sql, params=None):
+        return self.recorder(self.cursor.execute, sql, params, False, {'cursor': self.cursor})
+
+    def executemany(self, sql, param_list):
+        return self.recorder(self.cursor.executemany, sql, param_list, True, {'cursor': self.cursor})
+
+
+class QueryRecorder(object):
+    """ Context manager that records the number of queries run on a database connection,
+        the time spent running them and the number of rows they wrote:
+
+            with QueryRecorder() as recorder:
+                game.user_move(x, y)
+            recorder.queries, recorder.query_time, recorder.rows_written
+
+        Uses connection.execute_wrapper where Django provides it, and wraps the cursors of
+        the connection otherwise.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.queries = 0
+        self.query_time = 0.0
+        self.rows_written = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.time()
+        try:
+            return execute(sql, params)
+        finally:
+            self.record(sql, time.time() - start, getattr(context['cursor'], 'rowcount', 0))
+
+    def record(self, sql, duration, rowcount):
+        statement = sql.lstrip()[:9].upper()
+        if statement.startswith(TRANSACTION_STATEMENTS):
+            return
+        self.queries += 1
+        self.query_time += duration
+        if statement.startswith(WRITE_STATEMENTS) and rowcount > 0:
+            self.rows_written += rowcount
+
+    def __enter__(self):
+        if hasattr(self.connection, 'execute_wrapper'):
+            self.wrapper = self.connection.execute_wrapper(self)
+            self.wrapper.__enter__()
+        else:
+            self.wrapper = None
+            self.wrapped = {}
+            for name in ('make_cursor', 'make_debug_cursor'):
+                self.wrapped[name] = self.connection.__dict__.get(name)
+                setattr(self.connection, name, self.wrap_cursor_factory(getattr(self.connection, name)))
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self.wrapper is not None:
+            self.wrapper.__exit__(type, value, traceback)
+            return
+        for name, previous in self.wrapped.items():
+            if previous is None:
+                delattr(self.connection, name)
+            else:
+                setattr(self.connection, name, previous)
+
+    def wrap_cursor_factory(self, make_cursor):
+        def make_recording_cursor(cursor):
+            return RecordingCursorWrapper(make_cursor(cursor), self)
+        return make_recording_cursor
+
+
+def is_enabled():
+    """ Returns True if the MINESWEEPER_INSTRUMENTATION setting is on.
+    """
+    return getattr(settings, 'MINESWEEPER_INSTRUMENTATION', False)
+
+
+class Measurement(object):
+    """ One timed call: how long it took, the queries it ran and the number of cells of
+        the board it touched.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.duration = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.cells = 0
+
+
+class MetricsRegistry(object):
+    """ Totals of every measurement taken in this process, by name.  Read by the metrics
+        view.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def observe(self, measurement):
+        with self.lock:
+            metric = self.metrics.get(measurement.name)
+            if metric is None:
+                metric = self.metrics[measurement.name] = {
+                    'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'queries': 0,
+                    'query_seconds': 0.0, 'cells': 0,
+                }
+            metric['count'] += 1
+            metric['seconds'] += measurement.duration
+            metric['max_seconds'] = max(metric['max_seconds'], measurement.duration)
+            metric['queries'] += measurement.queries
+            metric['query_seconds'] += measurement.query_time
+            metric['cells'] += measurement.cells
+
+    def snapshot(self):
+        """ Returns a copy of the metrics, safe to read while requests keep recording.
+        """
+        with self.lock:
+            return dict((name, dict(metric)) for name, metric in self.metrics.items())
+
+    def reset(self):
+        with self.lock:
+            self.metrics = {}
+
+
+registry = MetricsRegistry()
+
+# The measurements taken during the current request, collected for the Server-Timing
+# header by InstrumentationMiddleware
+_local = threading.local()
+
+
+@contextmanager
+def timed(name):
+    """ Times the enclosed block and the queries it runs, and records the measurement in
+        the registry and in the Server-Timing header of the current request.  Does
+        nothing unless MINESWEEPER_INSTRUMENTATION is on.  Yields the Measurement so
+        that the block can set the number of cells it touched.
+    """
+    measurement = Measurement(name)
+    if not is_enabled():
+        yield measurement
+        return
+
+    recorder = QueryRecorder()
+    start = time.time()
+    try:
+        with recorder:
+            yield measurement
+    finally:
+        measurement.duration = time.time() - start
+        measurement.queries = recorder.queries
+        measurement.query_time = recorder.query_time
+        registry.observe(measurement)
+        measurements = getattr(_local, 'measurements', None)
+        if measurements is not None:
+            measurements.append(measurement)
+
+
+def instrumented(name, scans_board=False):
+    """ Decorates a method of a game, or of a turn, so that every call is timed under the
+        provided name.  The cells touched are the cells of the board the call changed,
+        or the whole board if scans_board is set.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not is_enabled():
+                return method(self, *args, **kwargs)
+            # Turns are measured on the board of their game
+            game = getattr(self, 'game', self)
+            changed = len(game.board.changed)
+            with timed(name) as measurement:
+                result = method(self, *args, **kwargs)
+                board = game.board
+                measurement.cells = len(board) if scans_board else len(board.changed) - changed
+            return result
+        return wrapper
+    return decorator
+
+
+def server_timing(measurements, request_measurement):
+    """ Returns the value of the Server-Timing header for the measurements taken during
+        a request, followed by the time spent in the database and in the whole request.
+    """
+    metrics = [
+        '{};dur={:.2f};desc="{} queries, {} cells"'.format(
+            measurement.name, measurement.duration * 1000, measurement.queries, measurement.cells
+        )
+        for measurement in measurements
+    ]
+    metrics.append('db;dur={:.2f};desc="{} queries"'.format(
+        request_measurement.query_time * 1000, request_measurement.queries
+    ))
+    metrics.append('total;dur={:.2f}'.format(request_measurement.duration * 1000))
+    return ', '.join(metrics)
+
+
+class InstrumentationMiddleware(object):
+    """ Times every request and adds a Server-Timing header listing the instrumented calls
+        it made, so that a slow request can be broken down in the browser.  Requests are
+        recorded in the registry as request.<url name>.  Removes itself from the
+        middleware chain unless MINESWEEPER_INSTRUMENTATION is on, so it costs nothing
+        when disabled; changing the setting requires a restart.
+    """
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.measurements = []
+        try:
+            with timed('request') as request_measurement:
+                response = self.get_response(request)
+                url_name = getattr(request.resolver_match, 'url_name', None)
+                request_measurement.name = 'request.{}'.format(url_name or 'unknown')
+            measurements = _local.measurements[:-1]
+        finally:
+            _local.measurements = None
+        response['Server-Timing'] = server_timing(measurements, request_measurement)
+        return response
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from minesweeper.archive import archivable_games, archive_game, delete_archived_turns
+
+
+class Command(BaseCommand):
+    help = (
+        'Archives games that have not been played for the provided number of days: packs '
+        'their moves into the game row and deletes their turns in batches.  Archived games '
+        'can still be viewed but no longer played.  Safe to stop at any point and run again, '
+        'which picks up where the last run stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='Archive games that have not been played for this many days.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of games archived, or turns deleted, between pauses.'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0.5, help='Seconds to sleep between batches.'
+        )
+        parser.add_argument('--limit', type=int, default=None, help='Most games to archive.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        limit = options['limit']
+
+        archived = 0
+        last_id = 0
+        while limit is None or archived < limit:
+            games = archivable_games(cutoff).filter(id__gt=last_id).order_by('id')
+            game_ids = list(games.values_list('id', flat=True)[:batch_size])
+            if not game_ids:
+                break
+            for game_id in game_ids[:None if limit is None else limit - archived]:
+                if archive_game(game_id, cutoff):
+                    archived += 1
+            last_id = game_ids[-1]
+            time.sleep(options['pause'])
+        self.stdout.write('Archived {} games'.format(archived))
+
+        deleted = delete_archived_turns(batch_size, options['pause'])
+        self.stdout.write('Deleted {} turns'.format(deleted))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from minesweeper.benchmark import SIZES, MoveBenchmark
+
+DEFAULT_BUDGETS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'benchmark_budgets.json'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the minesweeper move pipeline on boards of several sizes and reports '
+        'queries, rows written and latency per operation.  With --check, fails if any '
+        'operation runs more queries than its recorded budget.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--budgets', default=DEFAULT_BUDGETS)
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Exit with an error if an operation goes over its query budget.'
+        )
+        parser.add_argument(
+            '--record', action='store_true',
+            help='Write the measured query counts to the budgets file.'
+        )
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = MoveBenchmark(
+            sizes=options['sizes'], rounds=options['rounds'], seed=options['seed']
+        ).run()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write('{:<10} {:>5} {:>6} {:>8} {:>10} {:>9} {:>9}'.format(
+                'operation', 'size', 'count', 'queries', 'rows/op', 'p50 ms', 'p99 ms'
+            ))
+            for result in results:
+                self.stdout.write(
+                    '{operation:<10} {size:>5} {count:>6} {queries:>8} {rows_written:>10.1f} '
+                    '{p50_ms:>9.2f} {p99_ms:>9.2f}'.format(**result)
+                )
+
+        budgets_key = lambda result: '{}@{}'.format(result['operation'], result['size'])
+        if options['record']:
+            budgets = dict((budgets_key(result), result['queries']) for result in results)
+            with open(options['budgets'], 'w') as budgets_file:
+                json.dump(budgets, budgets_file, indent=4, sort_keys=True, separators=(',', ': '))
+                budgets_file.write('\n')
+            self.stdout.write('Recorded budgets in {}'.format(options['budgets']))
+
+        if options['check']:
+            with open(options['budgets']) as budgets_file:
+                budgets = json.load(budgets_file)
+            over = [
+                '{} ran {} queries, budget is {}'.format(
+                    budgets_key(result), result['queries'], budgets[budgets_key(result)]
+                )
+                for result in results
+                if budgets_key(result) in budgets and result['queries'] > budgets[budgets_key(result)]
+            ]
+            if over:
+                raise CommandError('Query budgets exceeded:\n' + '\n'.join(over))
+            self.stdout.write('All operations within their query budgets')
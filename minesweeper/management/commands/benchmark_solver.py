@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from minesweeper.benchmark import SIZES, SolverBenchmark
+from minesweeper.solver import DEFAULT_BUDGET
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the no-guess solver: boards checked per second and the time taken to '
+        'generate a no-guess board, for several board sizes and mine densities.  No-guess '
+        'generation gives up after --budget seconds, and the share of boards it gave up on '
+        'is shown as failed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+        parser.add_argument('--densities', type=float, nargs='+', default=[0.12, 0.15, 0.2])
+        parser.add_argument('--boards', type=int, default=100)
+        parser.add_argument(
+            '--processes', type=int, default=1, help='Solve the boards in a process pool.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--budget', type=float, default=DEFAULT_BUDGET,
+            help='Seconds to spend on each no-guess board before giving up.'
+        )
+        parser.add_argument(
+            '--generations', type=int, default=10,
+            help='No-guess boards to generate for each size and density.'
+        )
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = SolverBenchmark(
+            sizes=options['sizes'], densities=options['densities'], boards=options['boards'],
+            processes=options['processes'], seed=options['seed'], budget=options['budget'],
+            generations=options['generations']
+        ).run()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write('{:>5} {:>8} {:>7} {:>9} {:>9} {:>12} {:>12} {:>9}'.format(
+            'size', 'density', 'boards', 'solvable', 'boards/s', 'no-guess p50', 'no-guess p99',
+            'failed'
+        ))
+        for result in results:
+            self.stdout.write(
+                '{size:>5} {density:>8.2f} {boards:>7} {solvable:>9.0%} '
+                '{boards_per_second:>9.1f} {no_guess_p50_ms:>10.1f}ms {no_guess_p99_ms:>10.1f}ms '
+                '{no_guess_failed:>9.0%}'.format(**result)
+            )
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from minesweeper.models import MinesweeperGame
+from minesweeper.replay import Replay
+
+
+class Command(BaseCommand):
+    help = 'Writes the replays of the provided games to standard output, one JSON replay per line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('game_ids', type=int, nargs='+')
+
+    def handle(self, *args, **options):
+        for game_id in options['game_ids']:
+            try:
+                game = MinesweeperGame.objects.get(id=game_id)
+            except MinesweeperGame.DoesNotExist:
+                raise CommandError('Game with ID {} not found'.format(game_id))
+            if game.seed is None:
+                raise CommandError('Game with ID {} was created without a seed'.format(game_id))
+            self.stdout.write(Replay.from_game(game).dumps())
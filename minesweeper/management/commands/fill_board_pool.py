@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from minesweeper.models import PooledBoard
+
+
+class Command(BaseCommand):
+    help = (
+        'Tops up the pool of pre-generated boards for every configuration in '
+        'MINESWEEPER_BOARD_POOL that has fallen below MINESWEEPER_BOARD_POOL_LOW_WATER.  '
+        'With --loop, keeps checking every --interval seconds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--loop', action='store_true', help='Keep refilling the pools until stopped.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5, help='Seconds to sleep between checks.'
+        )
+
+    def handle(self, *args, **options):
+        low_water = getattr(settings, 'MINESWEEPER_BOARD_POOL_LOW_WATER', 50)
+        high_water = getattr(settings, 'MINESWEEPER_BOARD_POOL_HIGH_WATER', 200)
+        while True:
+            for board_size, num_mines in getattr(settings, 'MINESWEEPER_BOARD_POOL', []):
+                added = PooledBoard.objects.fill(
+                    board_size, num_mines, low_water, high_water, options['batch_size']
+                )
+                if added:
+                    self.stdout.write('Added {} boards of size {} with {} mines'.format(
+                        added, board_size, num_mines
+                    ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
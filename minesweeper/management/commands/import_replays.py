@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from minesweeper.replay import Replay
+
+
+class Command(BaseCommand):
+    help = 'Creates a game from every replay in a file written by export_replays.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+
+    def handle(self, *args, **options):
+        with io.open(options['path'], encoding='utf-8') as replays:
+            for line_number, line in enumerate(replays, 1):
+                if not line.strip():
+                    continue
+                try:
+                    replay = Replay.loads(line)
+                except ValueError as error:
+                    raise CommandError('Line {}: {}'.format(line_number, error))
+                game = replay.create_game()
+                self.stdout.write('Created game {} from line {}'.format(game.id, line_number))
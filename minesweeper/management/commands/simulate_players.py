@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from minesweeper.simulation import HISTOGRAM_BUCKETS, PlayerLoadTest
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates load with simulated players in several processes, each starting games and '
+        'playing them through the ajax views, and reports moves per second, latencies, '
+        'queries per request and error and lock conflict rates.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4, help='One player per process.')
+        parser.add_argument('--games', type=int, default=5, help='Games played by each player.')
+        parser.add_argument('--moves', type=int, default=200, help='Most moves in a game.')
+        parser.add_argument('--board-size', type=int, default=10)
+        parser.add_argument('--mines', type=int, default=10)
+        parser.add_argument('--undo-rate', type=float, default=0.05)
+        parser.add_argument(
+            '--url', default=None,
+            help='Base URL of a running server to play against, for example '
+                 'http://127.0.0.1:8000.  The views run in the player processes otherwise.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = PlayerLoadTest(
+            processes=options['processes'], games=options['games'], moves=options['moves'],
+            board_size=options['board_size'], num_mines=options['mines'],
+            undo_rate=options['undo_rate'], url=options['url'], seed=options['seed']
+        ).run()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            '{processes} players, {games} games ({won} won, {lost} lost), {requests} requests '
+            'in {seconds:.1f}s: {moves_per_second:.1f} moves/s, {error_rate:.2%} errors, '
+            '{lock_conflict_rate:.2%} lock conflicts'.format(**results)
+        )
+        self.stdout.write('{:>9} {:>7} {:>8} {:>9} {:>9} {:>9} {:>9}'.format(
+            'operation', 'count', 'queries', 'p50', 'p95', 'p99', 'max'
+        ))
+        for operation in results['operations']:
+            row = dict(operation)
+            row['queries'] = '-' if row['queries'] is None else '{:.1f}'.format(row['queries'])
+            self.stdout.write(
+                '{operation:>9} {count:>7} {queries:>8} {p50_ms:>7.1f}ms {p95_ms:>7.1f}ms '
+                '{p99_ms:>7.1f}ms {max_ms:>7.1f}ms'.format(**row)
+            )
+        self.stdout.write('Latency histogram, requests per bucket:')
+        self.stdout.write('{:>9} {}'.format('operation', ' '.join(
+            ['{:>7}'.format('<={}ms'.format(bound)) for bound in HISTOGRAM_BUCKETS] +
+            ['{:>7}'.format('more')]
+        )))
+        for operation in results['operations']:
+            self.stdout.write('{:>9} {}'.format(operation['operation'], ' '.join(
+                '{:>7}'.format(count) for bound, count in operation['histogram']
+            )))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 09:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='cells',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='turn',
+            name='x_location',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='turn',
+            name='y_location',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='turn',
+            name='selected_field',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='minesweeper.Field'),
+        ),
+    ]
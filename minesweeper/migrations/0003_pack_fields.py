@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 09:45
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Copied from minesweeper.board so that this migration does not change if the
+# board format does.
+VALUE_MASK = 0x0F
+MINED = 0x10
+VISIBLE = 0x20
+FLAGGED = 0x40
+
+
+def pack_fields(apps, schema_editor):
+    """ Packs the Field rows of every game into its cells column and converts the Field
+        ids stored on each Turn into board indexes.
+    """
+    MinesweeperGame = apps.get_model('minesweeper', 'MinesweeperGame')
+    Field = apps.get_model('minesweeper', 'Field')
+    Turn = apps.get_model('minesweeper', 'Turn')
+
+    for game in MinesweeperGame.objects.all().iterator():
+        fields = Field.objects.filter(game=game).values_list(
+            'id', 'x_location', 'y_location', 'flagged', 'mined', 'value', 'visible'
+        )
+        cells = bytearray(game.board_size * game.board_size)
+        indexes = {}
+        for field_id, x, y, flagged, mined, value, visible in fields:
+            index = x * game.board_size + y
+            indexes[field_id] = index
+            cells[index] = (
+                (value & VALUE_MASK if not mined else 0) |
+                (MINED if mined else 0) |
+                (VISIBLE if visible else 0) |
+                (FLAGGED if flagged else 0)
+            )
+        if not indexes:
+            continue
+        game.cells = bytes(cells)
+        game.save(update_fields=['cells'])
+
+        for turn in Turn.objects.filter(game=game).select_related('selected_field'):
+            turn.x_location = turn.selected_field.x_location
+            turn.y_location = turn.selected_field.y_location
+            turn.hidden_fields = [indexes[field_id] for field_id in turn.hidden_fields or []]
+            turn.flagged_fields = [indexes[field_id] for field_id in turn.flagged_fields or []]
+            turn.save(update_fields=['x_location', 'y_location', 'hidden_fields', 'flagged_fields'])
+
+
+def unpack_fields(apps, schema_editor):
+    """ Recreates the Field rows of every game from its cells column.
+    """
+    MinesweeperGame = apps.get_model('minesweeper', 'MinesweeperGame')
+    Field = apps.get_model('minesweeper', 'Field')
+    Turn = apps.get_model('minesweeper', 'Turn')
+
+    for game in MinesweeperGame.objects.exclude(cells=None).iterator():
+        cells = bytearray(game.cells)
+        fields = Field.objects.bulk_create([
+            Field(
+                game=game,
+                x_location=index // game.board_size,
+                y_location=index % game.board_size,
+                flagged=bool(cell & FLAGGED),
+                mined=bool(cell & MINED),
+                value=cell & VALUE_MASK,
+                visible=bool(cell & VISIBLE),
+            )
+            for index, cell in enumerate(cells)
+        ])
+        # bulk_create does not return primary keys on every backend
+        ids = dict(
+            ((x * game.board_size + y), field_id)
+            for field_id, x, y in Field.objects.filter(game=game).values_list('id', 'x_location', 'y_location')
+        )
+        if len(ids) != len(fields):
+            continue
+
+        for turn in Turn.objects.filter(game=game):
+            turn.selected_field_id = ids[turn.x_location * game.board_size + turn.y_location]
+            turn.hidden_fields = [ids[index] for index in turn.hidden_fields or []]
+            turn.flagged_fields = [ids[index] for index in turn.flagged_fields or []]
+            turn.save(update_fields=['selected_field', 'hidden_fields', 'flagged_fields'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0002_packed_board'),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_fields, unpack_fields),
+    ]
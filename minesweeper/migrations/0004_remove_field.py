@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 09:46
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0003_pack_fields'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='turn',
+            name='selected_field',
+        ),
+        migrations.RemoveField(
+            model_name='field',
+            name='game',
+        ),
+        migrations.DeleteModel(
+            name='Field',
+        ),
+        migrations.RemoveField(
+            model_name='minesweepergame',
+            name='board',
+        ),
+        migrations.RemoveField(
+            model_name='minesweepergame',
+            name='flagged',
+        ),
+        migrations.RemoveField(
+            model_name='minesweepergame',
+            name='visibility',
+        ),
+    ]
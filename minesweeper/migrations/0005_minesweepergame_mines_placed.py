@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 10:02
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0004_remove_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='mines_placed',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 10:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0005_minesweepergame_mines_placed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
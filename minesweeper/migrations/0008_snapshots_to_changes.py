@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 10:50
+from __future__ import unicode_literals
+
+import struct
+
+from django.db import migrations
+
+# Copied from minesweeper.board so that this migration does not change if the
+# board format does.
+VISIBLE = 0x20
+FLAGGED = 0x40
+STATE_MASK = VISIBLE | FLAGGED
+
+
+def pack_states(states):
+    values = [index << 8 | state for index, state in sorted(states.items())]
+    return struct.pack(str('<{}I').format(len(values)), *values)
+
+
+def unpack_states(data):
+    data = bytes(data or b'')
+    values = struct.unpack(str('<{}I').format(len(data) // 4), data)
+    return dict((value >> 8, value & 0xFF) for value in values)
+
+
+def snapshot_states(turn, num_cells):
+    """ Returns the state of every cell before the turn, from its snapshot.
+    """
+    hidden = set(turn.hidden_fields or [])
+    flagged = set(turn.flagged_fields or [])
+    return [
+        (0 if index in hidden else VISIBLE) | (FLAGGED if index in flagged else 0)
+        for index in range(num_cells)
+    ]
+
+
+def snapshots_to_changes(apps, schema_editor):
+    """ Converts the board snapshot of every turn into the states of the cells the turn
+        changed.  A turn that has not been undone changed the board from its own snapshot
+        to the snapshot of the next turn that has not been undone, or to the current board
+        for the last one.  Turns that have been undone can not be undone again, so they
+        are left without changes.
+    """
+    MinesweeperGame = apps.get_model('minesweeper', 'MinesweeperGame')
+    Turn = apps.get_model('minesweeper', 'Turn')
+
+    for game in MinesweeperGame.objects.exclude(cells=None).iterator():
+        num_cells = game.board_size * game.board_size
+        after = [cell & STATE_MASK for cell in bytearray(game.cells)]
+        turns = Turn.objects.filter(game=game, undone=False).order_by('-number', '-id')
+        for turn in turns:
+            before = snapshot_states(turn, num_cells)
+            turn.changes = pack_states(dict(
+                (index, state) for index, state in enumerate(before) if state != after[index]
+            ))
+            turn.save(update_fields=['changes'])
+            after = before
+        Turn.objects.filter(game=game, undone=True).update(changes=b'')
+
+
+def changes_to_snapshots(apps, schema_editor):
+    """ Rebuilds the board snapshot of every turn that has not been undone by undoing the
+        turns one by one from the current board.
+    """
+    MinesweeperGame = apps.get_model('minesweeper', 'MinesweeperGame')
+    Turn = apps.get_model('minesweeper', 'Turn')
+
+    for game in MinesweeperGame.objects.exclude(cells=None).iterator():
+        states = [cell & STATE_MASK for cell in bytearray(game.cells)]
+        turns = Turn.objects.filter(game=game, undone=False).order_by('-number', '-id')
+        for turn in turns:
+            for index, state in unpack_states(turn.changes).items():
+                states[index] = state
+            turn.hidden_fields = [index for index, state in enumerate(states) if not state & VISIBLE]
+            turn.flagged_fields = [index for index, state in enumerate(states) if state & FLAGGED]
+            turn.save(update_fields=['hidden_fields', 'flagged_fields'])
+        Turn.objects.filter(game=game, undone=True).update(hidden_fields=[], flagged_fields=[])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0007_turn_changes'),
+    ]
+
+    operations = [
+        migrations.RunPython(snapshots_to_changes, changes_to_snapshots),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 10:51
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0008_snapshots_to_changes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='turn',
+            name='flagged_fields',
+        ),
+        migrations.RemoveField(
+            model_name='turn',
+            name='hidden_fields',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 11:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def count_turns(apps, schema_editor):
+    """ Starts the turn counter of every game after its highest turn number.
+    """
+    MinesweeperGame = apps.get_model('minesweeper', 'MinesweeperGame')
+    Turn = apps.get_model('minesweeper', 'Turn')
+
+    for turns in Turn.objects.values('game').annotate(highest=Max('number')):
+        MinesweeperGame.objects.filter(pk=turns['game']).update(turn_count=turns['highest'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0009_remove_turn_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='turn_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_turns, migrations.RunPython.noop),
+    ]
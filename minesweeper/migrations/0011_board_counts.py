@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 12:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0010_minesweepergame_turn_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='hidden_safe_cells',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='num_flags',
+            field=models.IntegerField(null=True),
+        ),
+    ]
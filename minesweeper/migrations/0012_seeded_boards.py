@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 16:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0011_board_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='safe_index',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='seed',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='turn',
+            name='undone_after',
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 17:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0012_seeded_boards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='archived',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='move_log',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='minesweepergame',
+            name='updated',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 17:58
+from __future__ import unicode_literals
+
+import bisect
+
+from django.db import migrations
+from django.db.models import Count, F
+
+
+def renumber_turns(apps, schema_editor):
+    """ Turns used to be numbered after the last turn that had not been undone, so a turn
+        made after an undo shares its number with the turn that was undone.  Numbers the
+        turns of those games again in the order they were made, and moves the turn
+        counter and undone_after along, so that (game, number) can be unique.
+    """
+    MinesweeperGame = apps.get_model('minesweeper', 'MinesweeperGame')
+    Turn = apps.get_model('minesweeper', 'Turn')
+
+    duplicated = Turn.objects.values('game').annotate(
+        turns=Count('id'), numbers=Count('number', distinct=True)
+    ).filter(turns__gt=F('numbers'))
+    for game_id in [turns['game'] for turns in duplicated]:
+        game = MinesweeperGame.objects.get(pk=game_id)
+        turns = list(Turn.objects.filter(game=game).order_by('number', 'id'))
+        old_numbers = [turn.number for turn in turns]
+        shift = len(turns) - old_numbers[-1]
+
+        def renumbered(count):
+            # The new number of the last turn made by the time count turns were made
+            if count >= old_numbers[-1]:
+                return count + shift
+            return bisect.bisect_right(old_numbers, count)
+
+        for number, turn in enumerate(turns, 1):
+            turn.number = number
+            if turn.undone_after is not None:
+                turn.undone_after = renumbered(turn.undone_after)
+            turn.save(update_fields=['number', 'undone_after'])
+        game.turn_count = renumbered(game.turn_count)
+        game.save(update_fields=['turn_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0013_archived_games'),
+    ]
+
+    operations = [
+        migrations.RunPython(renumber_turns, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='turn',
+            unique_together=set([('game', 'number')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='turn',
+            index_together=set([('game', 'undone', 'number')]),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.6 on 2026-10-18 18:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('minesweeper', '0014_turn_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledBoard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('board_size', models.IntegerField()),
+                ('num_mines', models.IntegerField()),
+                ('seed', models.IntegerField()),
+                ('cells', models.BinaryField()),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='pooledboard',
+            index_together=set([('board_size', 'num_mines')]),
+        ),
+    ]
@@ -1,137 +1,340 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-import copy
-import itertools
-import json
-import operator
+import random
 
-from django.db.models import F, Q
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest, Least, Substr
 from django.utils import timezone
-from random import randint
-
-from django.contrib.postgres.fields import ArrayField
-from django.db import models
+from django.utils.functional import cached_property
 
+from minesweeper.board import (
+    VISIBLE, Board, pack_snapshot, pack_states, unpack_snapshot, unpack_states
+)
 from minesweeper.constants import IN_PROGRESS, WON, LOST
+from minesweeper.encoding import JSON, encode_boardstate
+from minesweeper.instrumentation import instrumented, timed
+from minesweeper.solver import DEFAULT_BUDGET, no_guess_seed
 from basegame.models import BaseGame
 
 
+class MinesweeperGameManager(models.Manager):
+
+    def lock(self, game_id):
+        """ Fetches the game with the provided ID and locks its row until the end of the
+            current transaction, so that moves on one game are processed one at a time
+            while other games are unaffected.  Must be called inside transaction.atomic.
+        """
+        return self.select_for_update().get(id=game_id)
+
+    def tile(self, game_id, x, y, width, height):
+        """ Fetches the game with the provided ID without its board, and the packed cells
+            of a tile of the board as returned by Board.tile.  Only the part of each row
+            inside the tile is read from the cells column, so the query stays the same
+            size however large the board is.  Returns a tuple of (game, cells).
+        """
+        row_length = Greatest(Least(Value(height), F('board_size') - y), Value(0))
+        rows = {}
+        for row in range(width):
+            # SUBSTRING positions start at 1
+            start = F('board_size') * (x + row) + (y + 1)
+            rows['tile_row_{}'.format(row)] = Substr(
+                'cells', start, row_length, output_field=models.BinaryField()
+            )
+        game = self.defer('cells').annotate(**rows).get(id=game_id)
+
+        # Boards without mines yet have no cells, which is the same as all hidden
+        empty_row = bytes(bytearray(max(0, min(height, game.board_size - y))))
+        cells = b''.join(
+            bytes(getattr(game, 'tile_row_{}'.format(row)) or empty_row)
+            for row in range(min(width, game.board_size - x))
+        )
+        return game, cells
+
+
 class MinesweeperGame(BaseGame):
-    """ A model to store game information
+    """ A model to store game information.  The whole board is packed into the cells
+        column (see minesweeper.board) so that a move only needs to load and save a
+        single row.
     """
     started = models.DateTimeField(null=True)
     board_size = models.IntegerField(default=10)
     num_mines = models.IntegerField(default=10)
-    board = ArrayField(ArrayField(models.IntegerField()), null=True)
-    visibility = ArrayField(ArrayField(models.BooleanField()), null=True)
-    flagged = ArrayField(ArrayField(models.BooleanField()), null=True)
+    cells = models.BinaryField(null=True)
+    # Kept up to date with the board so that it does not have to be counted on every
+    # load.  Null until the board has been counted once.
+    num_flags = models.IntegerField(null=True)
+    hidden_safe_cells = models.IntegerField(null=True)
+    mines_placed = models.BooleanField(default=True)
     status = models.IntegerField(default=IN_PROGRESS)
+    version = models.IntegerField(default=0)
+    turn_count = models.IntegerField(default=0)
+    # The mines are placed by a random.Random seeded with seed, avoiding the cell at
+    # safe_index if there is one, so that the board can be generated again
+    seed = models.IntegerField(null=True)
+    safe_index = models.IntegerField(null=True)
+    # When the board last changed
+    updated = models.DateTimeField(null=True)
+    # Set by minesweeper.archive once the turns of the game have been packed into
+    # move_log.  Archived games can be viewed but no longer played.
+    archived = models.DateTimeField(null=True)
+    move_log = models.BinaryField(null=True)
+
+    objects = MinesweeperGameManager()
+
+    # The columns written when the board changes
+    board_fields = [
+        'cells', 'num_flags', 'hidden_safe_cells', 'mines_placed', 'seed', 'safe_index',
+        'status', 'version', 'turn_count', 'updated'
+    ]
+
+    # Set by defer_writes, see minesweeper.state_cache
+    write_behind = False
+
+    # Whether mines placed around a first clear must be solvable without guessing, see
+    # minesweeper.solver.  None follows the MINESWEEPER_NO_GUESS setting.
+    no_guess = None
+
+    @cached_property
+    def board(self):
+        """ Returns the in-memory Board for this game, unpacked from the cells column.  If
+            MINESWEEPER_CHECK_COUNTS is set (it defaults to DEBUG) the stored counts are
+            checked against a full recount.
+        """
+        board = Board(
+            self.board_size, self.cells, self.num_flags, self.hidden_safe_cells,
+            revealed=self.status != IN_PROGRESS
+        )
+        if getattr(settings, 'MINESWEEPER_CHECK_COUNTS', settings.DEBUG):
+            board.check_counts()
+        return board
+
+    def __reduce__(self):
+        """ Pickles the board packed into cells, as plain bytes, so that games can be kept
+            in the state cache.
+        """
+        unpickle, args, data = super(MinesweeperGame, self).__reduce__()
+        data = dict(data)
+        if 'board' in data:
+            board = data.pop('board')
+            data['cells'] = board.to_bytes()
+            data['num_flags'] = board.flags
+            data['hidden_safe_cells'] = board.hidden_safe_cells
+        elif data['cells'] is not None:
+            data['cells'] = bytes(data['cells'])
+        return unpickle, args, data
+
+    def save(self, *args, **kwargs):
+        if 'board' in self.__dict__:
+            self.cells = self.board.to_bytes()
+            self.num_flags = self.board.flags
+            self.hidden_safe_cells = self.board.hidden_safe_cells
+        super(MinesweeperGame, self).save(*args, **kwargs)
+
+    def save_board(self):
+        """ Writes the board and the game status back to the database with a single
+            UPDATE and bumps the version of the game, so that clients can tell whether
+            the board they have is up to date.
+        """
+        self.version += 1
+        self.updated = timezone.now()
+        if self.write_behind:
+            self.unflushed_changes += 1
+        else:
+            self.save(update_fields=self.board_fields)
+
+    def save_turn(self, turn):
+        """ Saves a new or undone Turn of this game, or keeps it for the next flush if
+            writes are deferred.
+        """
+        if self.write_behind:
+            if turn.pk is None:
+                if turn not in self.pending_turns:
+                    self.pending_turns.append(turn)
+            else:
+                self.undone_turns[turn.pk] = turn.undone_after
+        elif turn.pk is None:
+            turn.save()
+        else:
+            turn.save(update_fields=['undone', 'undone_after'])
+
+    def defer_writes(self):
+        """ Keeps every change made to this game in memory instead of writing it to the
+            database, until flush is called.
+        """
+        self.write_behind = True
+        self.pending_turns = []
+        # The undone_after of every saved turn that was undone, by ID
+        self.undone_turns = {}
+        self.unflushed_changes = 0
+
+    def flush(self):
+        """ Writes the changes kept in memory since defer_writes or the last flush to the
+            database: one UPDATE for the board, one INSERT for the new turns and one UPDATE
+            for the turns that were undone.
+        """
+        if not self.unflushed_changes:
+            return
+        with transaction.atomic():
+            self.save(update_fields=self.board_fields)
+            Turn.objects.bulk_create(self.pending_turns)
+            if self.undone_turns:
+                undone_after = [
+                    When(id=turn_id, then=Value(after))
+                    for turn_id, after in self.undone_turns.items()
+                ]
+                Turn.objects.filter(id__in=list(self.undone_turns)).update(
+                    undone=True, undone_after=Case(*undone_after, output_field=IntegerField())
+                )
+        self.pending_turns = []
+        self.undone_turns = {}
+        self.unflushed_changes = 0
 
     def check_for_win(self):
         """ Checks if the player has won the game, and if they have, triggers the game_won
             function.  The game is won if all squares that do not contain mines are visible.
         """
-        if all(self.fields.filter(mined=False).values_list('visible', flat=True)):
+        if self.board.all_safe_cells_visible():
             self.game_won()
 
     def contains_mine(self, x, y):
         """ Accepts the x and y coordinates of a location in our array and returns True
             if that space contains a mine or False if it does not.
         """
-        return self.fields.get(x_location=x, y_location=y).mined
+        return self.board.is_mined(x, y)
 
     def flag_count(self):
         """ Returns an integer representing the total number of flagged fields
         """
-        return self.fields.filter(flagged=True).count()
+        return self.board.flag_count()
 
     def game_lost(self):
-        """ Changes conditions to reflect that the user has lost the game.
+        """ Changes conditions to reflect that the user has lost the game.  The caller is
+            responsible for saving the board.
         """
         self.status = LOST
-        self.save()
-        self.fields.all().update(visible=True)
+        self.board.reveal_all()
 
     def game_won(self):
-        """ Changes conditions to reflect that the user has won the game.
+        """ Changes conditions to reflect that the user has won the game.  The caller is
+            responsible for saving the board.
         """
         self.status = WON
-        self.save()
-        self.fields.all().update(visible=True)
+        self.board.reveal_all()
 
     def reset(self):
-        """ Resets the board
+        """ Resets the board, keeping the mines where they are.  The reset is saved as a
+            turn, so that it can be undone and replayed.  Archived games are not reset.
         """
-        self.fields.all().update(
-            visible=False,
-            flagged=False
-        )
+        if self.archived is not None:
+            return
+        previous_status = self.status
+        self.board.start_move()
+        self.board.reset()
         self.status = IN_PROGRESS
-        self.save()
+        if self.board.snapshot is not None or self.status != previous_status:
+            self.save_move(0, 0, 'reset', previous_status)
+        else:
+            self.save_board()
 
     def generate_board(self):
-        """ Generates our Field objects
+        """ Generates an empty board
         """
-        for x, y in itertools.product(range(0, self.board_size), range(0, self.board_size)):
-            Field.objects.get_or_create(game=self, x_location=x, y_location=y)
+        self.board = Board(self.board_size)
 
-    def generate_mines(self, mines=10, size=10):
+    @instrumented('generate_mines', scans_board=True)
+    def generate_mines(self, mines=10, size=10, safe_x=None, safe_y=None):
         """ Generates the initial board state.  Accepts an integer indicating the number
             of mines that should be placed and an integer representing the size
-            (horizontal and vertical) of the board array.
-        """
-        for num in range(self.num_mines):
-            self.place_mine()
-        # Generate empty board
-        for mined_field in self.fields.filter(mined=True):
-            mined_field.increment_adjacent_squares()
-
-    def place_mine(self):
-        """ Generates a tuple to represent the location of a mine in our array.  If the
-            tuple found is already present in our array, recurs itself to generate a new
-            tuple.
+            (horizontal and vertical) of the board array.  If safe_x and safe_y are
+            provided, no mine is placed at that location or next to it.  The same seed
+            and safe location always place the same mines.  For no-guess games the seed
+            is first moved on to one whose board can be cleared from the safe location
+            without guessing.
         """
-        x, y = randint(0, self.board_size - 1), randint(0, self.board_size - 1)
-        field = self.fields.get(x_location=x, y_location=y)
-        if not field.mined:
-            field.mined = True
-            field.save()
-        else:
-            self.place_mine()
+        if safe_x is not None:
+            self.safe_index = self.board.index(safe_x, safe_y)
+        no_guess = self.no_guess
+        if no_guess is None:
+            no_guess = getattr(settings, 'MINESWEEPER_NO_GUESS', False)
+        if no_guess and self.seed is not None and self.safe_index is not None:
+            self.seed = no_guess_seed(
+                self.board_size, self.num_mines, self.safe_index, self.seed,
+                getattr(settings, 'MINESWEEPER_NO_GUESS_BUDGET', DEFAULT_BUDGET)
+            )
+        rng = random.Random(self.seed) if self.seed is not None else random
+        self.board.generate_mines(self.num_mines, self.safe_index, rng)
+        self.mines_placed = True
 
-    def get_client_json_boardstate(self):
+    @instrumented('encode_board', scans_board=True)
+    def get_client_json_boardstate(self, encoding=JSON):
         """ Returns the current public boardstate in JSON format - only visible squares
-            and flagged squares.
+            and flagged squares.  Other encodings from minesweeper.encoding can be
+            requested for large boards.
         """
-        visible_array = self.get_visible_boardstate()
-        json_array = json.dumps(visible_array)
+        return encode_boardstate(self.board, encoding)
 
-        return json_array
+    def get_boardstate_changes(self):
+        """ Returns a list of [x, y, value] for every square changed since the game was
+            loaded, with the same public values as get_visible_boardstate.
+        """
+        return self.board.changes()
 
     def get_last_turn(self):
         """ Fetches the last turn that hasn't been undone if it exists.  Returns None if it does not.
         """
-        last_turn = Turn.objects.filter(game=self, undone=False)
-        return last_turn.latest('number') if last_turn.exists() else None
+        if self.write_behind:
+            for turn in reversed(self.pending_turns):
+                if not turn.undone:
+                    return turn
+            if self.pk is None:
+                # Games that were never saved, like replays, have no other turns
+                return None
+            turns = Turn.objects.exclude(id__in=list(self.undone_turns))
+        else:
+            turns = Turn.objects.all()
+        last_turn = turns.filter(game=self, undone=False).order_by('-number').first()
+        if last_turn:
+            # Share our board with the turn so that undoing it works on this instance
+            last_turn.game = self
+        return last_turn
 
+    @instrumented('get_visible_boardstate', scans_board=True)
     def get_visible_boardstate(self):
         """ Returns a 2D array with all publicly available information.
         """
-        array = [[0 for i in range(self.board_size)] for i in range(self.board_size)]
-        fields = self.fields.all().order_by('x_location', 'y_location')
-        for field in fields:
-            array[field.x_location][field.y_location] = field.visible_value()
-
-        return array
+        return self.board.visible_boardstate()
 
     def start(self):
         """ Starts the game by generating an empty board, generating the mines and setting
-            the started timestamp
+            the started timestamp.  If MINESWEEPER_LAZY_MINES is set, the mines are not
+            generated until the first clear, so that abandoned games never pay for a board
+            and the first click is always safe.  Otherwise the board is taken from the
+            pool of boards generated ahead of time if there is one left, unless the game
+            was given a seed.
         """
-        self.generate_board()
-        self.generate_mines()
-        self.started = timezone.now()
+        lazy = getattr(settings, 'MINESWEEPER_LAZY_MINES', False)
+        pooled = None
+        if not lazy and self.seed is None:
+            with timed('board_pool') as measurement:
+                pooled = PooledBoard.objects.claim(self.board_size, self.num_mines)
+                measurement.name = 'board_pool.hit' if pooled else 'board_pool.miss'
+
+        if pooled is not None:
+            self.seed = pooled.seed
+            self.board = pooled.board
+            self.mines_placed = True
+        else:
+            if self.seed is None:
+                self.seed = random.randint(0, 2 ** 31 - 1)
+            if lazy:
+                self.mines_placed = False
+            else:
+                self.generate_board()
+                self.generate_mines()
+        self.started = self.updated = timezone.now()
         self.status = IN_PROGRESS
         self.save()
 
@@ -143,140 +346,210 @@ class MinesweeperGame(BaseGame):
         if last_turn:
             last_turn.undo()
 
+    @instrumented('user_move')
     def user_move(self, x=None, y=None, move_type='clear'):
         """ Accepts the x and y coordinates of a move submitted by the player, updates our
-            board and determines if the game has been won or lost.
+            board and determines if the game has been won or lost.  move_type is clear,
+            flag, undo or chord, which clears the hidden cells around a visible number once
+            as many of them are flagged as it has adjacent mines.  The move is applied to
+            the in-memory board, which is then saved with a single UPDATE.  The game should
+            have been loaded with MinesweeperGame.objects.lock so that moves on the same
+            game do not interleave.  Archived games ignore every move, and finished games
+            every move but undo and reset.
         """
+        if self.archived is not None:
+            return
         if move_type == 'undo':
             return self.undo_last_turn()
-
-        field = self.fields.get(x_location=x, y_location=y)
-        if field.visible:
+        elif move_type == 'reset':
+            return self.reset()
+        elif self.status != IN_PROGRESS:
+            # Nothing is left to clear or flag once the game is over
             return
 
-        last_turn = self.get_last_turn()
-        current_turn, created = Turn.objects.get_or_create(
-            game=self,
-            number=(last_turn.number + 1) if last_turn else 1,
-            selected_field=field,
-            move_type=move_type,
-            hidden_fields=list(self.fields.filter(visible=False).values_list('id', flat=True)),
-            flagged_fields=list(self.fields.filter(flagged=True).values_list('id', flat=True)),
-            game_status=self.status
-        )
+        board = self.board
+        if move_type == 'chord':
+            chord_indexes = board.chord_indexes(x, y)
+            if not chord_indexes:
+                return
+        elif board.is_visible(x, y):
+            return
 
+        previous_status = self.status
+        board.start_move()
         if move_type == 'clear':
-            if field.mined:
+            if not self.mines_placed:
+                self.generate_mines(safe_x=x, safe_y=y)
+            if board.is_mined(x, y):
                 self.game_lost()
             else:
-                field.make_visible()
+                board.make_visible(x, y)
 
         elif move_type == 'flag' and self.flag_count() < self.num_mines:
-            field.flagged = False if field.flagged else True
-            field.save()
+            board.toggle_flag(x, y)
+        elif move_type == 'chord':
+            if any(board.is_mined(*board.coordinates(index)) for index in chord_indexes):
+                self.game_lost()
+            else:
+                for index in chord_indexes:
+                    # Earlier cells may already have cleared this one
+                    if not board.cells[index] & VISIBLE:
+                        board.make_visible(*board.coordinates(index))
         if not self.status == LOST:
             self.check_for_win()
-        current_turn.save()
-
+        if not board.previous_states and self.status == previous_status:
+            # Nothing changed, so there is nothing to write or undo
+            return
+        self.save_move(x, y, move_type, previous_status)
 
-class Field(models.Model):
-    """ A model to store the details of a Field.  A field is a single square on our board.
-        It has x and y coordinates representative of where it lives in our board and
-        boolean flags to determine it's various states.
-    """
-    game = models.ForeignKey(MinesweeperGame, related_name='fields')
-    x_location = models.IntegerField(default=0)
-    y_location = models.IntegerField(default=0)
-    flagged = models.BooleanField(default=False)
-    mined = models.BooleanField(default=False)
-    value = models.IntegerField(default=0)
-    visible = models.BooleanField(default=False)
-
-    def adjacent_fields(self):
-        """ Returns a queryset of fields that are adjacent to this field
+    def save_move(self, x, y, move_type, previous_status):
+        """ Saves the move just applied to the board as a new Turn, holding the previous
+            states of the cells it changed, and saves the board.
         """
-        offset_filters = []
-        for x_offset, y_offset in itertools.product(range(-1, 2), range(-1, 2)):
-            offset_filters.append(
-                Q(x_location=self.x_location + x_offset) &
-                Q(y_location=self.y_location + y_offset)
+        # Turn numbers keep counting up after an undo, so two turns of a game never
+        # share a number
+        self.turn_count += 1
+        self.save_turn(Turn(
+            game=self,
+            number=self.turn_count,
+            x_location=x,
+            y_location=y,
+            move_type=move_type,
+            game_status=previous_status,
+            changes=(
+                pack_snapshot(self.board.snapshot) if move_type == 'reset'
+                else pack_states(self.board.previous_states)
             )
-        query = Q(game=self.game)
-        query.add(reduce(operator.or_, offset_filters), Q.AND)
-
-        return Field.objects.filter(query)
-
-    def increment(self):
-        """ Increments the fields value by 1;  indicates the number of adjacent fields
-            that are mined.
-        """
-        self.value += 1
-        self.save()
-
-    def increment_adjacent_squares(self):
-        """ Increments the value of each adjacent Field by 1.
-        """
-        self.adjacent_fields().update(value=F('value') + 1)
-
-    def make_visible(self):
-        """ Sets the visible value of the field to True.  If the value of the field is 0,
-            also triggers adjacent fields to clear.
-        """
-        self.visible = True
-        self.save()
-        if self.value == 0:
-            self.recursive_make_visible_adjacent_squares()
-
-    def recursive_make_visible_adjacent_squares(self):
-        """ Marks adjancent squares as visible if the are neither visible nor mined. If
-            those squares have a value of 0, runs this function on those fields as well.
-        """
-        adjacent_fields = self.adjacent_fields().filter(visible=False, mined=False)
-        copy.copy(adjacent_fields).update(visible=True, flagged=False)
-
-        for adjacent_field in adjacent_fields:
-            if adjacent_field.value == 0:
-                adjacent_field.recursive_make_visible_adjacent_squares()
-
-    def visible_value(self):
-        """ Returns the value we want to provide for this cell for the user.  Should
-            be as follows:  If it's visible, we should return 'mined' if it is mined,
-            otherwise it's value.  If it's not visible, we should return 'flagged' if
-            it's flagged, and otherwise None.
+        ))
+        self.save_board()
+
+    def user_moves(self, moves):
+        """ Applies a list of (x, y, move_type) moves in order, as user_move would, and
+            stops at the first move that ends the game.  Unless the game is already kept
+            in the state cache, the writes of all the moves are deferred and flushed
+            together, so a batch costs a single UPDATE and INSERT however long it is.
+            The version is bumped once for the whole batch.  Returns the number of moves
+            applied.
         """
-        if self.visible:
-            if self.mined:
-                return 'mined'
-            elif self.flagged:
-                return 'flagged'
-            else:
-                return self.value
-        else:
-            return 'flagged' if self.flagged else None
+        write_behind = self.write_behind
+        if not write_behind:
+            self.defer_writes()
+        version = self.version
+        applied = 0
+        for x, y, move_type in moves:
+            if self.status != IN_PROGRESS:
+                break
+            self.user_move(x, y, move_type)
+            applied += 1
+        if self.version != version:
+            # No client ever sees the board between the moves of a batch
+            self.version = version + 1
+        if not write_behind:
+            self.flush()
+            self.write_behind = False
+        return applied
 
 
 class Turn(models.Model):
-        """ A model to store the details of what happened in a given turn.
+        """ A model to store the details of what happened in a given turn.  changes holds
+            the state of every cell the move changed, as it was before the move (see
+            minesweeper.board.pack_states), so that undoing a turn only touches those cells.
+            A reset changes every cell, so it holds a snapshot of the state of every cell
+            instead (see minesweeper.board.pack_snapshot).
         """
         game = models.ForeignKey(MinesweeperGame)
-        selected_field = models.ForeignKey(Field)
+        x_location = models.IntegerField(default=0)
+        y_location = models.IntegerField(default=0)
         number = models.IntegerField(default=0)
         move_type = models.CharField(max_length=10, default='')
         undone = models.BooleanField(default=False)
-        hidden_fields = ArrayField(models.IntegerField(), null=True)
-        flagged_fields = ArrayField(models.IntegerField(), null=True)
+        # The turn_count of the game when this turn was undone, so that undos can be
+        # replayed in the right place
+        undone_after = models.IntegerField(null=True)
+        changes = models.BinaryField(null=True)
         game_status = models.IntegerField(default=0)
 
+        class Meta:
+            unique_together = ('game', 'number')
+            # For the last turn of a game that has not been undone, see get_last_turn
+            index_together = ('game', 'undone', 'number')
+
+        @instrumented('turn_undo')
         def undo(self):
             """ Reverses whatever actions were taken on the previous turn
             """
-            if self.move_type == 'clear':
-                self.game.fields.filter(id__in=self.hidden_fields).update(visible=False)
-                self.game.fields.filter(id__in=self.flagged_fields).update(flagged=True)
-            elif self.move_type == 'flag':
-                self.selected_field.flagged = False
-                self.selected_field.save()
+            if self.move_type == 'reset':
+                self.game.board.restore_snapshot(unpack_snapshot(self.changes))
+            else:
+                self.game.board.restore(unpack_states(self.changes))
             self.game.status = self.game_status
-            self.game.save()
+            self.game.board.revealed = self.game_status != IN_PROGRESS
+            self.game.save_board()
             self.undone = True
-            self.save()
+            self.undone_after = self.game.turn_count
+            self.game.save_turn(self)
+
+
+class PooledBoardManager(models.Manager):
+
+    def claim(self, board_size, num_mines):
+        """ Takes a board with the provided size and number of mines out of the pool and
+            returns it, or returns None if the pool is empty.  Boards locked by another
+            transaction are skipped instead of waited for, so that games started at the
+            same time neither block each other nor get the same board.
+        """
+        with transaction.atomic():
+            pooled = self.select_for_update(skip_locked=True).filter(
+                board_size=board_size, num_mines=num_mines
+            ).first()
+            if pooled is not None:
+                pooled.delete()
+        return pooled
+
+    def generate(self, board_size, num_mines):
+        """ Returns a new unsaved board with the provided size and number of mines, placed
+            with a new seed.
+        """
+        seed = random.randint(0, 2 ** 31 - 1)
+        board = Board(board_size)
+        board.generate_mines(num_mines, rng=random.Random(seed))
+        return self.model(
+            board_size=board_size, num_mines=num_mines, seed=seed, cells=board.to_bytes()
+        )
+
+    def fill(self, board_size, num_mines, low_water, high_water, batch_size=100):
+        """ Tops the pool of boards with the provided size and number of mines back up to
+            high_water boards if it has fallen below low_water, inserting batch_size
+            boards at a time.  Returns the number of boards added.
+        """
+        available = self.filter(board_size=board_size, num_mines=num_mines).count()
+        if available >= low_water:
+            return 0
+        added = 0
+        while available + added < high_water:
+            count = min(batch_size, high_water - available - added)
+            self.bulk_create([self.generate(board_size, num_mines) for board in range(count)])
+            added += count
+        return added
+
+
+class PooledBoard(models.Model):
+    """ A board with its mines placed, generated ahead of time by the fill_board_pool
+        command so that starting a game does not have to generate one.  Claimed boards
+        are deleted from the pool.
+    """
+    board_size = models.IntegerField()
+    num_mines = models.IntegerField()
+    seed = models.IntegerField()
+    cells = models.BinaryField()
+
+    objects = PooledBoardManager()
+
+    class Meta:
+        index_together = ('board_size', 'num_mines')
+
+    @property
+    def board(self):
+        """ Returns the in-memory Board, with every cell hidden and nothing flagged.
+        """
+        return Board(self.board_size, self.cells, 0, self.board_size ** 2 - self.num_mines)
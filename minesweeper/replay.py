@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import base64
+import bisect
+import json
+import struct
+
+from django.db import transaction
+from django.utils import timezone
+
+from minesweeper.constants import IN_PROGRESS
+from minesweeper.models import MinesweeperGame
+
+REPLAY_VERSION = 1
+
+# Every move of a replay is packed into four bytes, holding the index of the cell in the
+# upper bits and the position of the move type in this tuple in the lowest three
+MOVE_TYPES = ('clear', 'flag', 'chord', 'undo', 'reset')
+
+
+def pack_moves(moves, board_size):
+    """ Packs a list of (x, y, move_type) moves into bytes.
+    """
+    values = [(x * board_size + y) << 3 | MOVE_TYPES.index(move_type) for x, y, move_type in moves]
+    return struct.pack(str('<{}I').format(len(values)), *values)
+
+
+def unpack_moves(data, board_size):
+    """ Unpacks bytes written by pack_moves back into a list of (x, y, move_type) moves.
+    """
+    values = struct.unpack(str('<{}I').format(len(data) // 4), data)
+    return [divmod(value >> 3, board_size) + (MOVE_TYPES[value & 7],) for value in values]
+
+
+def turn_moves(game):
+    """ Returns every move made in a game, undos included, rebuilt from its turns.  Turns
+        only record when they were undone since undone_after was added, so older turns
+        that were undone are assumed to have been undone just before the next turn that
+        was not.
+    """
+    turns = list(game.turn_set.order_by('number', 'id'))
+    kept = [turn.number for turn in turns if not turn.undone]
+    events = []
+    for turn in turns:
+        events.append((turn.number, 0, 0, (turn.x_location, turn.y_location, turn.move_type)))
+        if turn.undone:
+            undone_after = turn.undone_after
+            if undone_after is None:
+                next_kept = bisect.bisect_right(kept, turn.number)
+                if next_kept < len(kept):
+                    undone_after = kept[next_kept] - 1
+                else:
+                    undone_after = turns[-1].number
+            # Undos at the same point take back the latest turn first
+            events.append((undone_after, 1, -turn.number, (0, 0, 'undo')))
+    events.sort()
+    return [event[-1] for event in events]
+
+
+class Replay(object):
+    """ Everything needed to play a game again: the seed its mines were placed with, the
+        size of the board, the number of mines and every move in order, undos included.
+        A replay is a few bytes per move, where the game itself stores its whole board
+        and a row per turn.  Mines are placed by random.Random, so a replay only plays
+        back the same board on the major Python version that recorded it.
+    """
+
+    def __init__(self, seed, board_size, num_mines, safe_index=None, mines_placed=True, moves=()):
+        self.seed = seed
+        self.board_size = board_size
+        self.num_mines = num_mines
+        self.safe_index = safe_index
+        # False if the game was recorded before its mines were placed, in which case they
+        # are placed on the first clear of the replay
+        self.mines_placed = mines_placed
+        self.moves = list(moves)
+
+    @classmethod
+    def from_game(cls, game):
+        """ Returns the replay of a game saved in the database, from its move_log if it has
+            been archived and from its turns otherwise.
+        """
+        if game.move_log is not None:
+            moves = unpack_moves(bytes(game.move_log), game.board_size)
+        else:
+            moves = turn_moves(game)
+        return cls(
+            seed=game.seed,
+            board_size=game.board_size,
+            num_mines=game.num_mines,
+            safe_index=game.safe_index,
+            mines_placed=game.mines_placed,
+            moves=moves
+        )
+
+    def dumps(self):
+        """ Returns the replay as a JSON string, with the moves packed by pack_moves and
+            base64 encoded.
+        """
+        return json.dumps({
+            'version': REPLAY_VERSION,
+            'seed': self.seed,
+            'board_size': self.board_size,
+            'num_mines': self.num_mines,
+            'safe_index': self.safe_index,
+            'mines_placed': self.mines_placed,
+            'moves': base64.b64encode(pack_moves(self.moves, self.board_size)).decode('ascii'),
+        }, sort_keys=True)
+
+    @classmethod
+    def loads(cls, data):
+        """ Returns the replay from a JSON string written by dumps.  Raises ValueError if the
+            string is not a replay.
+        """
+        try:
+            replay = json.loads(data)
+            if replay.get('version') != REPLAY_VERSION:
+                raise ValueError('Unsupported replay version {}'.format(replay.get('version')))
+            return cls(
+                seed=replay['seed'],
+                board_size=replay['board_size'],
+                num_mines=replay['num_mines'],
+                safe_index=replay['safe_index'],
+                mines_placed=replay['mines_placed'],
+                moves=unpack_moves(base64.b64decode(replay['moves']), replay['board_size'])
+            )
+        except (KeyError, TypeError, AttributeError, struct.error) as error:
+            raise ValueError('Invalid replay: {}'.format(error))
+
+    def run(self, moves=None):
+        """ Plays the replay on a new game kept in memory, without touching the database,
+            and returns the game.  Plays every move unless the number of moves to play
+            is provided.
+        """
+        game = MinesweeperGame(
+            seed=self.seed,
+            board_size=self.board_size,
+            num_mines=self.num_mines,
+            status=IN_PROGRESS
+        )
+        game.defer_writes()
+        # The seed of a no-guess game already places its board
+        game.no_guess = False
+        game.generate_board()
+        game.mines_placed = False
+        if self.mines_placed:
+            game.safe_index = self.safe_index
+            game.generate_mines()
+        for x, y, move_type in self.moves[:moves]:
+            game.user_move(x, y, move_type)
+        return game
+
+    def create_game(self):
+        """ Plays the replay and saves the resulting game, with its turns, as a new game.
+        """
+        game = self.run()
+        game.started = timezone.now()
+        with transaction.atomic():
+            game.save()
+            for turn in game.pending_turns:
+                # Turns were made before the game had an ID
+                turn.game = game
+            game.flush()
+        game.write_behind = False
+        return game
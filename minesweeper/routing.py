@@ -0,0 +1,6 @@
+from channels.routing import route_class
+from minesweeper.consumers import GameConsumer
+
+channel_routing = [
+    route_class(GameConsumer, path=r'^/ws/(?P<game_id>\d+)/$'),
+]
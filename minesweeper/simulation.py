@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import base64
+import json
+import logging
+import multiprocessing
+import random
+import re
+import time
+
+from django.db import DatabaseError, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils.six.moves import http_cookiejar
+from django.utils.six.moves.urllib import error as urllib_error
+from django.utils.six.moves.urllib import parse as urllib_parse
+from django.utils.six.moves.urllib import request as urllib_request
+
+from minesweeper.benchmark import percentile
+from minesweeper.board import FLAGGED_CODE, HIDDEN_CODE, MINED_CODE, Board
+from minesweeper.constants import IN_PROGRESS, LOST
+from minesweeper.instrumentation import QueryRecorder
+
+# Upper bounds of the latency histogram buckets, in milliseconds; slower requests are
+# counted in a last bucket with no bound
+HISTOGRAM_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Errors that mean the database refused to wait for a lock held by another player
+LOCK_ERRORS = ('lock', 'deadlock', 'could not serialize')
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class HttpResponse(object):
+    """ The parts of a response a simulated player reads, matching the responses of the
+        Django test client.
+    """
+
+    def __init__(self, status_code, content, headers):
+        self.status_code = status_code
+        self.content = content
+        self.headers = dict((name.lower(), value) for name, value in headers)
+
+    def __getitem__(self, header):
+        return self.headers[header.lower()]
+
+    def get(self, header, default=None):
+        return self.headers.get(header.lower(), default)
+
+
+class NoRedirectHandler(urllib_request.HTTPRedirectHandler):
+    """ Returns redirects to the caller, which reads the new game from their Location.
+    """
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient(object):
+    """ Sends the requests of a simulated player to a running server, with the interface
+        of the Django test client.  Keeps the cookies of the server and sends the CSRF
+        token with every POST, like minesweeper.js.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http_cookiejar.CookieJar()
+        self.opener = urllib_request.build_opener(
+            urllib_request.HTTPCookieProcessor(self.cookies), NoRedirectHandler()
+        )
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, method, path, data, extra):
+        data = urllib_parse.urlencode(data or {})
+        url = self.base_url + path
+        if method == 'GET':
+            request = urllib_request.Request('{}?{}'.format(url, data) if data else url)
+        else:
+            request = urllib_request.Request(url, data.encode('ascii'))
+            request.add_header('X-CSRFToken', self.csrf_token())
+            request.add_header('Referer', url)
+        for name, value in extra.items():
+            # Test client style HTTP_X_REQUESTED_WITH to X-Requested-With
+            request.add_header(name[5:].replace('_', '-').title(), value)
+        try:
+            response = self.opener.open(request)
+        except urllib_error.HTTPError as error:
+            response = error
+        return HttpResponse(response.code, response.read(), response.info().items())
+
+    def get(self, path, data=None, **extra):
+        return self.request('GET', path, data, extra)
+
+    def post(self, path, data=None, **extra):
+        if not self.csrf_token():
+            # Loads the page first, like a browser, for the CSRF cookie
+            self.get(path)
+        return self.request('POST', path, data, extra)
+
+
+class PlayerStats(object):
+    """ The requests a player made, by operation, and how many of them failed.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.queries = {}
+        self.errors = 0
+        self.lock_conflicts = 0
+        self.games = 0
+        self.won = 0
+        self.lost = 0
+
+    def add(self, operation, duration, queries):
+        self.latencies.setdefault(operation, []).append(duration)
+        if queries is not None:
+            self.queries.setdefault(operation, []).append(queries)
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+class SimulatedPlayer(object):
+    """ Plays games through the same views as a browser: starts a game by posting the new
+        game form, loads the board and then plays moves through AjaxProcessMove until the
+        game ends.  Moves follow a simple solver policy, clearing and flagging the cells
+        around visible numbers that can be worked out and clearing a random hidden cell
+        otherwise, with the occasional undo.  Lost games are undone, reset or given up.
+    """
+
+    def __init__(self, client, stats, rng, board_size=10, num_mines=10, undo_rate=0.05,
+                 in_process=True):
+        self.client = client
+        self.stats = stats
+        self.rng = rng
+        self.board_size = board_size
+        self.num_mines = num_mines
+        self.undo_rate = undo_rate
+        # Queries are counted in this process when the views run in it, and read from
+        # the Server-Timing header of a running server otherwise
+        self.in_process = in_process
+        self.board = Board(board_size)
+        self.game_id = None
+        self.codes = None
+        self.status = IN_PROGRESS
+
+    def request(self, operation, method, url, data):
+        """ Sends a request and records its latency and queries.  Returns the response, or
+            None if it failed.
+        """
+        ajax = operation not in ('new_game', 'page')
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'} if ajax else {}
+        send = self.client.post if method == 'POST' else self.client.get
+        queries = None
+        start = time.time()
+        try:
+            if self.in_process:
+                with QueryRecorder() as recorder:
+                    response = send(url, data, **headers)
+                queries = recorder.queries
+            else:
+                response = send(url, data, **headers)
+                match = SERVER_TIMING_QUERIES.search(response.get('Server-Timing', ''))
+                queries = int(match.group(1)) if match else None
+        except DatabaseError as error:
+            self.stats.add(operation, time.time() - start, None)
+            if any(message in str(error).lower() for message in LOCK_ERRORS):
+                self.stats.lock_conflicts += 1
+            else:
+                self.stats.errors += 1
+            return None
+        self.stats.add(operation, time.time() - start, queries)
+        if response.status_code >= 400:
+            self.stats.errors += 1
+            return None
+        return response
+
+    def new_game(self):
+        response = self.request('new_game', 'POST', reverse('minesweeper_new'), {
+            'num_mines': self.num_mines, 'board_size': self.board_size
+        })
+        if response is None:
+            return False
+        self.game_id = int(response['Location'].rstrip('/').split('/')[-1])
+        self.stats.games += 1
+        self.request('page', 'GET', reverse('minesweeper', kwargs={'game_id': self.game_id}), {})
+        return self.load_board()
+
+    def show_board(self, data):
+        self.codes = bytearray(base64.b64decode(data['json_boardstate']))
+        self.status = data['game_status']
+
+    def load_board(self):
+        response = self.request('board', 'GET', reverse('ajax_board_state'), {
+            'game_id': self.game_id, 'encoding': 'base64'
+        })
+        if response is None:
+            return False
+        self.show_board(json.loads(response.content.decode('utf-8')))
+        return True
+
+    def reset(self):
+        response = self.request('reset', 'POST', reverse('ajax_reset_game'), {
+            'game_id': self.game_id, 'encoding': 'base64'
+        })
+        if response is not None:
+            self.show_board(json.loads(response.content.decode('utf-8')))
+
+    def move(self, x, y, move_type):
+        operation = 'undo' if move_type == 'undo' else 'move'
+        response = self.request(operation, 'POST', reverse('ajax_submit_move'), {
+            'game_id': self.game_id, 'x': x, 'y': y, 'move_type': move_type
+        })
+        if response is None:
+            return
+        data = json.loads(response.content.decode('utf-8'))
+        if data.get('changes') is None:
+            self.load_board()
+            return
+        for change_x, change_y, value in data['changes']:
+            if value == 'flagged':
+                code = FLAGGED_CODE
+            elif value == 'mined':
+                code = MINED_CODE
+            else:
+                code = HIDDEN_CODE if value is None else value
+            self.codes[self.board.index(change_x, change_y)] = code
+        self.status = data['game_status']
+
+    def choose_move(self):
+        """ Returns the next (x, y, move_type) to play.
+        """
+        codes = self.codes
+        hidden_cells = [index for index, code in enumerate(codes) if code == HIDDEN_CODE]
+        if self.rng.random() < self.undo_rate:
+            return 0, 0, 'undo'
+        for index in self.rng.sample(range(len(codes)), len(codes)):
+            value = codes[index]
+            if value == 0 or value >= HIDDEN_CODE:
+                continue
+            adjacent = self.board.adjacent_indexes(index)
+            hidden = [cell for cell in adjacent if codes[cell] == HIDDEN_CODE]
+            if not hidden:
+                continue
+            flagged = sum(1 for cell in adjacent if codes[cell] == FLAGGED_CODE)
+            if flagged == value:
+                return self.board.coordinates(index) + ('chord',)
+            if flagged + len(hidden) == value:
+                return self.board.coordinates(hidden[0]) + ('flag',)
+        return self.board.coordinates(self.rng.choice(hidden_cells)) + ('clear',)
+
+    def play(self, max_moves=200):
+        """ Plays one game, of at most max_moves moves.
+        """
+        if not self.new_game():
+            return
+        for move in range(max_moves):
+            if self.status == LOST:
+                choice = self.rng.random()
+                if choice < 0.3:
+                    self.move(0, 0, 'undo')
+                    continue
+                elif choice < 0.6:
+                    self.reset()
+                    continue
+            if self.status != IN_PROGRESS or HIDDEN_CODE not in self.codes:
+                break
+            self.move(*self.choose_move())
+        if self.status == LOST:
+            self.stats.lost += 1
+        elif self.status != IN_PROGRESS:
+            self.stats.won += 1
+
+
+def play_games(args):
+    """ Runs one simulated player for the provided number of games and returns its
+        stats as a dict.  Takes a single tuple so that it can be mapped over a process
+        pool.
+    """
+    number, options = args
+    rng = random.Random('{}-{}'.format(options['seed'], number))
+    stats = PlayerStats()
+    if options['url']:
+        client, in_process = HttpClient(options['url']), False
+    else:
+        client, in_process = Client(), True
+        # Failed requests are counted, rather than logged with their traceback
+        logging.getLogger('django.request').disabled = True
+    player = SimulatedPlayer(
+        client, stats, rng, options['board_size'], options['num_mines'], options['undo_rate'],
+        in_process
+    )
+    with override_settings(ALLOWED_HOSTS=['testserver', 'localhost', '127.0.0.1']):
+        for game in range(options['games']):
+            player.play(options['moves'])
+    connections.close_all()
+    return stats.as_dict()
+
+
+class PlayerLoadTest(object):
+    """ Runs simulated players in a pool of processes, each player playing its games one
+        after the other, and reports the moves per second the players managed together,
+        latency percentiles and histograms, queries per request and error and lock
+        conflict rates.  Players run the views in their own process through the Django
+        test client against the configured database, or send real requests to a running
+        server if a URL is provided.  The games they play are left in the database.
+    """
+
+    def __init__(self, processes=4, games=5, moves=200, board_size=10, num_mines=10,
+                 undo_rate=0.05, url=None, seed=0):
+        self.processes = processes
+        self.options = {
+            'games': games,
+            'moves': moves,
+            'board_size': board_size,
+            'num_mines': num_mines,
+            'undo_rate': undo_rate,
+            'url': url,
+            'seed': seed,
+        }
+
+    def run(self):
+        work = [(number, self.options) for number in range(self.processes)]
+        # Every process opens its own database connections
+        connections.close_all()
+        start = time.time()
+        if self.processes > 1:
+            pool = multiprocessing.Pool(self.processes)
+            try:
+                results = pool.map(play_games, work)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [play_games(args) for args in work]
+        return self.summary(results, time.time() - start)
+
+    def summary(self, results, duration):
+        latencies, queries = {}, {}
+        for result in results:
+            for operation, values in result['latencies'].items():
+                latencies.setdefault(operation, []).extend(values)
+            for operation, values in result['queries'].items():
+                queries.setdefault(operation, []).extend(values)
+        requests = sum(len(values) for values in latencies.values())
+        errors = sum(result['errors'] for result in results)
+        lock_conflicts = sum(result['lock_conflicts'] for result in results)
+        moves = len(latencies.get('move', [])) + len(latencies.get('undo', []))
+
+        operations = []
+        for operation in sorted(latencies):
+            values = latencies[operation]
+            operation_queries = queries.get(operation)
+            operations.append({
+                'operation': operation,
+                'count': len(values),
+                'queries': (
+                    sum(operation_queries) / float(len(operation_queries))
+                    if operation_queries else None
+                ),
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+                'max_ms': max(values) * 1000,
+                'histogram': histogram(values),
+            })
+        return {
+            'processes': self.processes,
+            'seconds': duration,
+            'games': sum(result['games'] for result in results),
+            'won': sum(result['won'] for result in results),
+            'lost': sum(result['lost'] for result in results),
+            'requests': requests,
+            'moves': moves,
+            'moves_per_second': moves / duration if duration else 0,
+            'error_rate': errors / float(requests) if requests else 0,
+            'lock_conflict_rate': lock_conflicts / float(requests) if requests else 0,
+            'operations': operations,
+        }
+
+
+def histogram(durations):
+    """ Returns the number of durations, in seconds, that fall in each bucket of
+        HISTOGRAM_BUCKETS, as a list of [upper bound in ms, count].  The bound of the last
+        bucket, of durations slower than every bound, is None.
+    """
+    bounds = HISTOGRAM_BUCKETS + (None,)
+    counts = [0] * len(bounds)
+    for duration in durations:
+        milliseconds = duration * 1000
+        bucket = 0
+        while bucket < len(HISTOGRAM_BUCKETS) and milliseconds > HISTOGRAM_BUCKETS[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    return [[bound, count] for bound, count in zip(bounds, counts)]
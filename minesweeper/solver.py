@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import random
+import time
+
+from minesweeper.board import MINED, VALUE_MASK, Board
+
+# What the solver knows about each cell
+UNKNOWN = 0
+SAFE = 1
+MINE = 2
+
+# Seconds no-guess generation may spend looking for a solvable board
+DEFAULT_BUDGET = 0.1
+
+# The adjacent indexes of every cell are shared by all the boards of a size up to this
+MAX_SHARED_ADJACENCY_SIZE = 100
+_adjacency = {}
+
+
+def adjacency(board):
+    """ Returns a list of the adjacent indexes of every cell of the board.
+    """
+    adjacent = _adjacency.get(board.size)
+    if adjacent is None:
+        adjacent = [board.adjacent_indexes(index) for index in range(len(board))]
+        if board.size <= MAX_SHARED_ADJACENCY_SIZE:
+            _adjacency[board.size] = adjacent
+    return adjacent
+
+
+class Solver(object):
+    """ Plays a board the way a player who never guesses would, to decide whether it can
+        be won from a first clear without guessing.  The solver only uses what a player
+        can see: the numbers of the cells it has cleared and the number of mines left.
+
+        Every cleared number with hidden cells around it gives a constraint: the set of
+        its unknown adjacent cells and how many of them are mines.  Each step applies,
+        until one of them makes progress:
+
+            - the single cell rules: a constraint with no mines left is all safe and one
+              with as many mines as cells is all mines
+            - the pair rules: for two overlapping constraints A and B, if B needs as many
+              more mines than A as it has cells outside A, those cells are mines and the
+              cells of A outside B are safe, and if A is a subset of B with as many mines,
+              the cells of B outside A are safe
+            - the mine count: once every mine is known the other cells are safe, and once
+              only mines can be left every unknown cell is one
+
+        Constraints cover at most eight cells, so they are kept as frozensets of cell
+        indexes, which cost the same on any size of board.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.known = bytearray(len(board))
+        self.adjacent = adjacency(board)
+        # The constraint of every cleared number with unknown cells around it, and the
+        # numbers whose constraint has to be worked out again
+        self.frontier = {}
+        self.dirty = set()
+        self.mines_left = sum(1 for cell in board.cells if cell & MINED)
+        self.safe_left = len(board) - self.mines_left
+        self.unknown_left = len(board)
+
+    def clear(self, index):
+        """ Clears a cell known to be safe, and every cell around it while the cleared cell
+            has no adjacent mines, like a player's clear.
+        """
+        cells = self.board.cells
+        stack = [index]
+        while stack:
+            index = stack.pop()
+            if self.known[index] != UNKNOWN:
+                continue
+            self.known[index] = SAFE
+            self.safe_left -= 1
+            self.unknown_left -= 1
+            adjacent = self.adjacent[index]
+            self.dirty.update(adjacent)
+            if cells[index] & VALUE_MASK:
+                self.dirty.add(index)
+            else:
+                stack.extend(adjacent)
+
+    def mark_mine(self, index):
+        if self.known[index] == UNKNOWN:
+            self.known[index] = MINE
+            self.mines_left -= 1
+            self.unknown_left -= 1
+            self.dirty.update(self.adjacent[index])
+
+    def constraints(self):
+        """ Returns the set of (cells, mines) constraints given by the cleared numbers.
+            Only the numbers next to a cell that became known since the last call are
+            worked out again, and those with no unknown cells left are dropped.
+        """
+        cells = self.board.cells
+        known = self.known
+        for index in self.dirty:
+            if known[index] != SAFE or not cells[index] & VALUE_MASK:
+                continue
+            unknown = []
+            mines = cells[index] & VALUE_MASK
+            for adjacent_index in self.adjacent[index]:
+                state = known[adjacent_index]
+                if state == UNKNOWN:
+                    unknown.append(adjacent_index)
+                elif state == MINE:
+                    mines -= 1
+            if unknown:
+                self.frontier[index] = (frozenset(unknown), mines)
+            else:
+                self.frontier.pop(index, None)
+        self.dirty.clear()
+        return set(self.frontier.values())
+
+    def deduce(self):
+        """ Returns the sets of cells that can be shown to be safe and to be mines, trying
+            the cheaper rules first.
+        """
+        safe, mines = set(), set()
+        constraints = self.constraints()
+        for cells, count in constraints:
+            if count == 0:
+                safe |= cells
+            elif count == len(cells):
+                mines |= cells
+        if safe or mines:
+            return safe, mines
+
+        by_cell = {}
+        for constraint in constraints:
+            for index in constraint[0]:
+                by_cell.setdefault(index, []).append(constraint)
+        for a_cells, a_mines in constraints:
+            others = set()
+            for index in a_cells:
+                others.update(by_cell[index])
+            for b_cells, b_mines in others:
+                if b_cells == a_cells:
+                    continue
+                b_only = b_cells - a_cells
+                if b_mines - a_mines == len(b_only):
+                    mines |= b_only
+                    safe |= a_cells - b_cells
+                elif b_mines == a_mines and a_cells < b_cells:
+                    safe |= b_only
+        if safe or mines:
+            return safe, mines
+
+        if self.mines_left == 0 or self.mines_left == self.unknown_left:
+            unknown = set(index for index, state in enumerate(self.known) if state == UNKNOWN)
+            return (unknown, set()) if self.mines_left == 0 else (set(), unknown)
+        return safe, mines
+
+    def solve(self, safe_index):
+        """ Returns True if the board can be won without guessing from a first clear on the
+            cell at safe_index.
+        """
+        if self.board.cells[safe_index] & MINED:
+            return False
+        self.clear(safe_index)
+        while self.safe_left:
+            safe, mines = self.deduce()
+            if not (safe or mines):
+                return False
+            for index in mines:
+                self.mark_mine(index)
+            for index in safe:
+                self.clear(index)
+        return True
+
+
+def is_solvable(board, safe_index):
+    """ Returns True if the board can be won without guessing from a first clear on the
+        cell at safe_index.
+    """
+    return Solver(board).solve(safe_index)
+
+
+def no_guess_seed(board_size, num_mines, safe_index, seed, budget=DEFAULT_BUDGET):
+    """ Returns the first seed, counting up from the provided one, whose mines placed by
+        Board.generate_mines can be cleared without guessing from safe_index.  Gives up
+        after budget seconds and returns the last seed tried, whose board may need a
+        guess.
+    """
+    return search_no_guess_seed(board_size, num_mines, safe_index, seed, budget)[0]
+
+
+def search_no_guess_seed(board_size, num_mines, safe_index, seed, budget=DEFAULT_BUDGET):
+    """ Searches for a seed like no_guess_seed, and returns a tuple of the seed and
+        whether its board can be cleared without guessing, which is False if the search
+        ran out of budget.
+    """
+    deadline = time.time() + budget
+    while True:
+        board = Board(board_size)
+        board.generate_mines(num_mines, safe_index, random.Random(seed))
+        solvable = is_solvable(board, safe_index)
+        if solvable or time.time() >= deadline:
+            return seed, solvable
+        seed = (seed + 1) % 2 ** 31
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import DatabaseError, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from minesweeper.constants import IN_PROGRESS
+from minesweeper.models import MinesweeperGame
+
+DEFAULT_BACKEND = 'minesweeper.state_cache.LocMemStateCache'
+
+_state_cache = None
+
+
+class LockTimeout(DatabaseError):
+    """ Raised when the lock of a cached game is not released in time.
+    """
+
+
+class BaseStateCache(object):
+    """ Holds live games between requests so that moves are applied to the cached board
+        and written to the database in batches.  A game is flushed when it ends, when it
+        is evicted and every flush_every changes.  Games are stored pickled so that every
+        request works on its own copy.  Subclasses provide the storage and a per-game lock.
+    """
+
+    def __init__(self, flush_every=10, **options):
+        self.flush_every = flush_every
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'flushes': 0}
+
+    def key(self, game_id):
+        return 'minesweeper:game:{}'.format(game_id)
+
+    def load(self, game_id):
+        """ Returns the pickled game stored for the provided ID, or None.
+        """
+        raise NotImplementedError
+
+    def store(self, game_id, data):
+        """ Stores a pickled game.  Returns a list of the IDs of the games that had to be
+            evicted to make room for it, which are passed to evicted once the lock of the
+            stored game is released.
+        """
+        raise NotImplementedError
+
+    def delete(self, game_id):
+        """ Removes the game stored for the provided ID, if there is one.
+        """
+        raise NotImplementedError
+
+    def lock(self, game_id):
+        """ Returns a context manager that holds the lock for the provided game ID.
+        """
+        raise NotImplementedError
+
+    def get(self, game_id):
+        """ Returns the cached game for the provided ID, or None if it is not cached.
+        """
+        data = self.load(game_id)
+        if data is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return pickle.loads(data)
+
+    def flush(self, game):
+        if game.unflushed_changes:
+            game.flush()
+            self.stats['flushes'] += 1
+
+    def evicted(self, game_id):
+        """ Flushes a game that store evicted.  Only called by backends that evict.
+        """
+        raise NotImplementedError
+
+    def uncache(self, game_id):
+        """ Flushes the game for the provided ID, if it is cached, and removes it from the
+            cache so that it is read from the database again.  The caller must hold the
+            lock of the game.
+        """
+        data = self.load(game_id)
+        if data is not None:
+            self.flush(pickle.loads(data))
+            self.delete(game_id)
+
+    @contextmanager
+    def game_for_update(self, game_id):
+        """ Yields the game for the provided ID with its writes deferred, loading it from
+            the database if it is not cached, and stores it back once the caller is done.
+            If the caller raises, the changes are discarded.
+        """
+        with self.lock(game_id):
+            game = self.get(game_id)
+            if game is None:
+                game = MinesweeperGame.objects.get(id=game_id)
+                game.defer_writes()
+            yield game
+            if game.status != IN_PROGRESS or game.unflushed_changes >= self.flush_every:
+                self.flush(game)
+            evicted = self.store(game_id, pickle.dumps(game, pickle.HIGHEST_PROTOCOL))
+
+        for evicted_id in evicted:
+            self.evicted(evicted_id)
+
+
+class LocMemStateCache(BaseStateCache):
+    """ Keeps up to max_entries games in the memory of the current process and evicts the
+        least recently used one when full.  Only suitable when every request for a game is
+        served by the same process.  Evicted games are kept in evicting until they have
+        been flushed, and are still read from there, so that a request for a game being
+        flushed never falls back to the older row in the database.
+    """
+
+    def __init__(self, max_entries=1000, lock_stripes=64, **options):
+        super(LocMemStateCache, self).__init__(**options)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.evicting = {}
+        self.mutex = threading.Lock()
+        self.locks = [threading.Lock() for stripe in range(lock_stripes)]
+
+    def load(self, game_id):
+        key = self.key(game_id)
+        with self.mutex:
+            data = self.entries.pop(key, None)
+            if data is not None:
+                self.entries[key] = data
+            else:
+                data = self.evicting.get(key)
+        return data
+
+    def store(self, game_id, data):
+        evicted = []
+        key = self.key(game_id)
+        with self.mutex:
+            self.evicting.pop(key, None)
+            self.entries.pop(key, None)
+            self.entries[key] = data
+            while len(self.entries) > self.max_entries:
+                evicted_key, evicted_data = self.entries.popitem(last=False)
+                self.evicting[evicted_key] = evicted_data
+                evicted.append(evicted_key.rsplit(':', 1)[-1])
+        return evicted
+
+    def delete(self, game_id):
+        with self.mutex:
+            self.entries.pop(self.key(game_id), None)
+            self.evicting.pop(self.key(game_id), None)
+
+    def evicted(self, game_id):
+        """ Flushes an evicted game and then forgets it, unless it has been stored again
+            since, in which case its changes are still cached.
+        """
+        self.stats['evictions'] += 1
+        key = self.key(game_id)
+        with self.lock(game_id):
+            with self.mutex:
+                data = self.evicting.get(key)
+            if data is not None:
+                self.flush(pickle.loads(data))
+                with self.mutex:
+                    del self.evicting[key]
+
+    def lock(self, game_id):
+        return self.locks[hash(self.key(game_id)) % len(self.locks)]
+
+
+class DjangoStateCache(BaseStateCache):
+    """ Keeps games in one of the caches from the CACHES setting, so that they can be
+        shared between processes.  The cache evicts entries without telling us, so a game
+        dropped by the cache loses the changes made since its last flush; keep flush_every
+        low and size the cache for the number of live games.
+    """
+
+    def __init__(self, alias='default', timeout=3600, lock_timeout=5, lock_expiry=60,
+                 **options):
+        super(DjangoStateCache, self).__init__(**options)
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.lock_expiry = lock_expiry
+
+    def load(self, game_id):
+        return self.cache.get(self.key(game_id))
+
+    def store(self, game_id, data):
+        self.cache.set(self.key(game_id), data, self.timeout)
+        return []
+
+    def delete(self, game_id):
+        self.cache.delete(self.key(game_id))
+
+    @contextmanager
+    def lock(self, game_id):
+        """ Holds a lock stored in the cache itself, under a token of its own so that only
+            the holder releases it.  Raises LockTimeout if the lock is not free within
+            lock_timeout.  A lock expires after lock_expiry, in case the process holding it
+            died, which should be much longer than any request holds it.
+        """
+        key = self.key(game_id) + ':lock'
+        token = uuid.uuid4().hex
+        deadline = time.time() + self.lock_timeout
+        while not self.cache.add(key, token, self.lock_expiry):
+            if time.time() >= deadline:
+                raise LockTimeout('Timed out waiting for the lock on game {}'.format(game_id))
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            # The lock may have expired and been taken by another process in the meantime
+            if self.cache.get(key) == token:
+                self.cache.delete(key)
+
+
+def get_state_cache():
+    """ Returns the state cache configured by the MINESWEEPER_STATE_CACHE setting, or None
+        if games are not cached.  The setting is a dict with a BACKEND and the options of
+        that backend in upper case, for example:
+
+        MINESWEEPER_STATE_CACHE = {
+            'BACKEND': 'minesweeper.state_cache.LocMemStateCache',
+            'MAX_ENTRIES': 1000,
+            'FLUSH_EVERY': 10,
+        }
+    """
+    global _state_cache
+    config = getattr(settings, 'MINESWEEPER_STATE_CACHE', None)
+    if not config:
+        return None
+    if _state_cache is None:
+        options = dict((key.lower(), value) for key, value in config.items() if key != 'BACKEND')
+        _state_cache = import_string(config.get('BACKEND', DEFAULT_BACKEND))(**options)
+    return _state_cache
+
+
+@receiver(setting_changed)
+def reset_state_cache(**kwargs):
+    global _state_cache
+    if kwargs['setting'] == 'MINESWEEPER_STATE_CACHE':
+        _state_cache = None
+
+
+@contextmanager
+def game_for_update(game_id):
+    """ Yields the game for the provided ID so that it can be changed: from the state cache
+        if one is configured, otherwise locked in the database for the current transaction.
+        Raises MinesweeperGame.DoesNotExist if there is no such game.
+    """
+    state_cache = get_state_cache()
+    if state_cache is None:
+        with transaction.atomic():
+            yield MinesweeperGame.objects.lock(game_id)
+    else:
+        with state_cache.game_for_update(game_id) as game:
+            yield game
+
+
+@contextmanager
+def uncached_game(game_id):
+    """ Holds the lock of the game for the provided ID in the state cache, if one is
+        configured, with any cached changes written to the database and the game dropped
+        from the cache, so that the caller can change the game row directly.  Games that
+        are not cached are not loaded into the cache.
+    """
+    state_cache = get_state_cache()
+    if state_cache is None:
+        yield
+    else:
+        with state_cache.lock(game_id):
+            state_cache.uncache(game_id)
+            yield
+
+
+def get_game(game_id, defer_board=False):
+    """ Returns the game for the provided ID to be read, from the state cache if it is
+        cached there.  If defer_board is set and the game is read from the database, the
+        board is only loaded if it is used.  Raises MinesweeperGame.DoesNotExist if there
+        is no such game.
+    """
+    state_cache = get_state_cache()
+    game = state_cache.get(game_id) if state_cache is not None else None
+    if game is not None:
+        return game
+    games = MinesweeperGame.objects.defer('cells') if defer_board else MinesweeperGame.objects
+    return games.get(id=game_id)
+
+
+def get_game_version(game_id):
+    """ Returns a tuple of the version, the updated timestamp and the archived timestamp
+        of the game for the provided ID, from the state cache if it is cached there and
+        otherwise from those columns of the game row alone.  Raises
+        MinesweeperGame.DoesNotExist if there is no such game.
+    """
+    state_cache = get_state_cache()
+    game = state_cache.get(game_id) if state_cache is not None else None
+    if game is not None:
+        return game.version, game.updated, game.archived
+    return MinesweeperGame.objects.values_list('version', 'updated', 'archived').get(id=game_id)
+
+
+def get_tile(game_id, x, y, width, height):
+    """ Returns a tuple of the game for the provided ID, to be read, and the packed cells
+        of a tile of its board (see MinesweeperGameManager.tile).  Raises
+        MinesweeperGame.DoesNotExist if there is no such game.
+    """
+    state_cache = get_state_cache()
+    game = state_cache.get(game_id) if state_cache is not None else None
+    if game is not None:
+        return game, game.board.tile(x, y, width, height)
+    return MinesweeperGame.objects.tile(game_id, x, y, width, height)
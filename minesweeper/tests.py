@@ -0,0 +1,837 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import importlib
+import json
+import os
+import pickle
+import random
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from unittest import skipUnless
+
+from channels import Group
+from channels.test import ChannelTestCase, WSClient
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from minesweeper import board as board_module
+from minesweeper.ajax_views import get_move_context
+from minesweeper.archive import archive_game
+from minesweeper.benchmark import MoveBenchmark
+from minesweeper.board import HIDDEN_CODE, MINED, VALUE_MASK, Board, unpack_states
+from minesweeper.consumers import GameConsumer
+from minesweeper.constants import IN_PROGRESS, LOST
+from minesweeper.models import MinesweeperGame, PooledBoard, Turn
+from minesweeper.replay import Replay, pack_moves, unpack_moves
+from minesweeper.state_cache import (
+    DjangoStateCache, LockTimeout, game_for_update, get_game, get_state_cache
+)
+
+snapshots_to_changes = importlib.import_module('minesweeper.migrations.0008_snapshots_to_changes')
+
+
+def new_game(board_size=10, num_mines=10, seed=1):
+    """ Returns a started game whose mines are placed from the provided seed.
+    """
+    game = MinesweeperGame.objects.create(board_size=board_size, num_mines=num_mines, seed=seed)
+    with override_settings(MINESWEEPER_LAZY_MINES=False):
+        game.start()
+    return game
+
+
+def mined_cell(game):
+    """ Returns the coordinates of a mined cell of the game.
+    """
+    board = game.board
+    for index in range(len(board)):
+        if board.is_mined(*board.coordinates(index)):
+            return board.coordinates(index)
+
+
+# Recount the cells whenever a board is loaded, as DEBUG does outside of the tests
+check_counts = override_settings(MINESWEEPER_CHECK_COUNTS=True)
+
+
+def mine_count(board):
+    return sum(board.is_mined(*board.coordinates(index)) for index in range(len(board)))
+
+
+def locmem_state_cache(max_entries=10, flush_every=3):
+    return override_settings(MINESWEEPER_STATE_CACHE={
+        'BACKEND': 'minesweeper.state_cache.LocMemStateCache',
+        'MAX_ENTRIES': max_entries,
+        'FLUSH_EVERY': flush_every,
+    })
+
+
+class BoardTest(SimpleTestCase):
+
+    @skipUnless(board_module.numpy is not None, "requires NumPy")
+    def test_numpy_counts_match_the_python_counts(self):
+        for size, num_mines in ((1, 0), (2, 3), (10, 10), (16, 40), (30, 300)):
+            mines = random.Random(size).sample(range(size * size), num_mines)
+            counted = Board(size)
+            counted.count_adjacent_mines(mines)
+
+            numpy, board_module.numpy = board_module.numpy, None
+            try:
+                expected = Board(size)
+                expected.generate_mines(num_mines, rng=random.Random(size))
+            finally:
+                board_module.numpy = numpy
+            self.assertEqual(counted.cells, expected.cells, size)
+
+
+@check_counts
+@override_settings(MINESWEEPER_LAZY_MINES=True)
+class LazyMinesTest(TestCase):
+
+    def first_clear(self, seed, x, y, num_mines=20):
+        game = MinesweeperGame.objects.create(board_size=10, num_mines=num_mines, seed=seed)
+        game.start()
+        self.assertFalse(game.mines_placed)
+        game.user_move(x, y, 'clear')
+        self.assertTrue(game.mines_placed)
+        return game
+
+    def test_first_clear_and_its_neighbours_are_never_mined(self):
+        for seed in range(5):
+            for x, y in ((0, 0), (0, 9), (9, 0), (9, 9), (0, 4), (5, 5)):
+                game = self.first_clear(seed, x, y)
+                board = game.board
+                index = board.index(x, y)
+                for safe_index in [index] + list(board.adjacent_indexes(index)):
+                    self.assertFalse(
+                        board.is_mined(*board.coordinates(safe_index)), (seed, x, y)
+                    )
+                self.assertEqual(mine_count(board), 20)
+                self.assertEqual(game.status, IN_PROGRESS)
+
+    def test_crowded_boards_keep_only_the_first_clear_safe(self):
+        # 95 mines do not fit outside of the neighbours of the first clear
+        game = self.first_clear(1, 5, 5, num_mines=95)
+        self.assertFalse(game.board.is_mined(5, 5))
+        self.assertEqual(mine_count(game.board), 95)
+
+
+@check_counts
+class UndoTest(TestCase):
+    """ Undoing a move puts back the exact board and counters from before the move.
+    """
+
+    def setUp(self):
+        self.game = new_game()
+
+    def state(self):
+        game = MinesweeperGame.objects.get(id=self.game.id)
+        board = game.board
+        return bytes(board.cells), board.flags, board.hidden_safe_cells, game.status
+
+    def assert_undone(self, x, y, move_type):
+        before = self.state()
+        with game_for_update(self.game.id) as game:
+            game.user_move(x, y, move_type)
+        self.assertNotEqual(self.state(), before)
+        with game_for_update(self.game.id) as game:
+            game.user_move(x, y, 'undo')
+        self.assertEqual(self.state(), before)
+
+    def test_undo_flag(self):
+        self.assert_undone(0, 0, 'flag')
+
+    def test_undo_flood_fill(self):
+        board = self.game.board
+        empty = [
+            index for index, cell in enumerate(board.cells)
+            if not cell & (MINED | VALUE_MASK)
+        ]
+        x, y = board.coordinates(empty[0])
+        self.assert_undone(x, y, 'clear')
+
+    def test_undo_losing_clear(self):
+        x, y = mined_cell(self.game)
+        self.assert_undone(x, y, 'clear')
+
+    def play(self, *moves):
+        with game_for_update(self.game.id) as game:
+            for x, y, move_type in moves:
+                game.user_move(x, y, move_type)
+
+    def test_undo_reset(self):
+        x, y = mined_cell(self.game)
+        self.play((x, y, 'flag'), (0, 0, 'clear'))
+        self.assert_undone(0, 0, 'reset')
+        turn = Turn.objects.get(game=self.game, move_type='reset')
+        self.assertLess(len(turn.changes), len(self.game.board))
+
+    def test_undo_reset_of_a_lost_game(self):
+        x, y = mined_cell(self.game)
+        self.play((x, y, 'clear'))
+        self.assert_undone(0, 0, 'reset')
+
+
+@check_counts
+class BoardCountsTest(TestCase):
+
+    def test_out_of_date_counts_are_caught_when_the_board_is_loaded(self):
+        game = new_game()
+        MinesweeperGame.objects.filter(id=game.id).update(num_flags=3)
+        with self.assertRaises(AssertionError):
+            MinesweeperGame.objects.get(id=game.id).board
+
+
+@check_counts
+class ReplayTest(TestCase):
+
+    def mines(self, game):
+        board = game.board
+        return [index for index in range(len(board)) if board.is_mined(*board.coordinates(index))]
+
+    @override_settings(MINESWEEPER_LAZY_MINES=True)
+    def test_same_seed_and_first_clear_place_the_same_mines(self):
+        games = []
+        for seed in (7, 7, 8):
+            game = MinesweeperGame.objects.create(board_size=10, num_mines=20, seed=seed)
+            game.start()
+            game.user_move(3, 4, 'clear')
+            games.append(game)
+        self.assertEqual(games[0].safe_index, games[1].safe_index)
+        self.assertEqual(self.mines(games[0]), self.mines(games[1]))
+        self.assertNotEqual(self.mines(games[0]), self.mines(games[2]))
+
+    def test_dumps_and_loads_round_trip(self):
+        moves = [(0, 0, 'clear'), (9, 9, 'flag'), (0, 9, 'chord'), (0, 0, 'undo'), (0, 0, 'reset')]
+        self.assertEqual(unpack_moves(pack_moves(moves, 10), 10), moves)
+
+        replay = Replay.loads(Replay(5, 10, 20, safe_index=34, moves=moves).dumps())
+        self.assertEqual(
+            (replay.seed, replay.board_size, replay.num_mines, replay.safe_index),
+            (5, 10, 20, 34)
+        )
+        self.assertTrue(replay.mines_placed)
+        self.assertEqual(replay.moves, moves)
+        for data in ('', '{}', '{"version": 1}', '[]'):
+            with self.assertRaises(ValueError):
+                Replay.loads(data)
+
+    def test_created_game_matches_the_recorded_game(self):
+        game = new_game()
+        x, y = mined_cell(game)
+        with game_for_update(game.id) as game:
+            for move in ((x, y, 'flag'), (0, 0, 'clear'), (0, 0, 'undo'), (0, 0, 'reset'),
+                         (9, 9, 'clear'), (x, y, 'clear')):
+                game.user_move(*move)
+        game = MinesweeperGame.objects.get(id=game.id)
+        self.assertEqual(game.status, LOST)
+
+        created = Replay.loads(Replay.from_game(game).dumps()).create_game()
+        created = MinesweeperGame.objects.get(id=created.id)
+        self.assertNotEqual(created.id, game.id)
+        self.assertEqual(bytes(created.cells), bytes(game.cells))
+        self.assertEqual(
+            (created.status, created.num_flags, created.hidden_safe_cells, created.turn_count),
+            (game.status, game.num_flags, game.hidden_safe_cells, game.turn_count)
+        )
+        self.assertEqual(Replay.from_game(created).moves, Replay.from_game(game).moves)
+
+
+@check_counts
+@override_settings(MINESWEEPER_LAZY_MINES=False)
+class BoardPoolTest(TestCase):
+
+    def start(self, board_size=10, num_mines=10):
+        game = MinesweeperGame.objects.create(board_size=board_size, num_mines=num_mines)
+        game.start()
+        return MinesweeperGame.objects.get(id=game.id)
+
+    def test_fill_tops_the_pool_up_to_high_water(self):
+        self.assertEqual(PooledBoard.objects.fill(10, 10, 5, 12, batch_size=5), 12)
+        self.assertEqual(PooledBoard.objects.filter(board_size=10, num_mines=10).count(), 12)
+        # Nothing is added until the pool falls below low water
+        self.assertEqual(PooledBoard.objects.fill(10, 10, 5, 12, batch_size=5), 0)
+        for pooled in PooledBoard.objects.all()[:8]:
+            pooled.delete()
+        self.assertEqual(PooledBoard.objects.fill(10, 10, 5, 12, batch_size=5), 8)
+        self.assertEqual(PooledBoard.objects.count(), 12)
+
+    def test_start_claims_a_matching_board(self):
+        PooledBoard.objects.fill(10, 10, 1, 3)
+        PooledBoard.objects.fill(16, 40, 1, 3)
+        pooled = dict((board.seed, board) for board in PooledBoard.objects.filter(board_size=10))
+
+        game = self.start()
+        self.assertIn(game.seed, pooled)
+        self.assertEqual(bytes(game.cells), bytes(pooled[game.seed].cells))
+        self.assertFalse(PooledBoard.objects.filter(id=pooled[game.seed].id).exists())
+        self.assertEqual(PooledBoard.objects.filter(board_size=10).count(), 2)
+        self.assertEqual(PooledBoard.objects.filter(board_size=16).count(), 3)
+
+        board = game.board
+        self.assertEqual(mine_count(board), 10)
+        self.assertEqual((board.flags, board.hidden_safe_cells), (0, 90))
+        self.assertEqual(board.public_bytes(), bytes(bytearray([HIDDEN_CODE] * 100)))
+
+    def test_empty_pool_generates_the_board(self):
+        PooledBoard.objects.fill(16, 40, 1, 3)
+        game = self.start()
+        self.assertTrue(game.mines_placed)
+        self.assertIsNotNone(game.seed)
+        self.assertEqual(mine_count(game.board), 10)
+        self.assertEqual(PooledBoard.objects.count(), 3)
+
+
+@check_counts
+class AjaxProcessMoveTest(TestCase):
+
+    def setUp(self):
+        self.game = new_game()
+        self.client = Client(HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def move(self, x, y, move_type='clear'):
+        response = self.client.post(reverse('ajax_submit_move'), {
+            'game_id': self.game.id, 'x': x, 'y': y, 'move_type': move_type
+        })
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode('utf-8'))
+
+    def moves(self, moves):
+        response = self.client.post(reverse('ajax_submit_moves'), {
+            'game_id': self.game.id, 'moves': json.dumps(moves)
+        })
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode('utf-8'))
+
+    def numbered_cells(self):
+        """ Returns the coordinates of the cells without a mine that are next to a mine,
+            which a clear shows on their own.
+        """
+        board = self.game.board
+        return [
+            board.coordinates(index) for index, cell in enumerate(board.cells)
+            if not cell & MINED and cell & VALUE_MASK
+        ]
+
+    def test_move_changes_only_its_cell(self):
+        data = self.move(1, 5, 'flag')
+        self.assertEqual(data['changes'], [[1, 5, 'flagged']])
+
+    def test_moves_off_the_board_are_rejected(self):
+        for x, y in ((0, 15), (-1, 0), (10, 0), (0, 10), ('a', 0), ('', '')):
+            data = self.move(x, y, 'flag')
+            self.assertNotIn('changes', data)
+            self.assertIn('move_type', data['message'])
+        game = MinesweeperGame.objects.get(id=self.game.id)
+        self.assertEqual(game.version, self.game.version)
+        self.assertEqual(game.turn_set.count(), 0)
+
+    def test_reset_is_not_a_move_type(self):
+        self.move(1, 5, 'flag')
+        data = self.move(0, 0, 'reset')
+        self.assertNotIn('changes', data)
+        self.assertEqual(MinesweeperGame.objects.get(id=self.game.id).num_flags, 1)
+
+    def test_chord_on_a_satisfied_number_clears_its_neighbours(self):
+        x, y = self.numbered_cells()[0]
+        self.move(x, y)
+        board = self.game.board
+        adjacent = [board.coordinates(index) for index in board.adjacent_indexes(board.index(x, y))]
+        for adjacent_x, adjacent_y in adjacent:
+            if board.is_mined(adjacent_x, adjacent_y):
+                self.move(adjacent_x, adjacent_y, 'flag')
+
+        data = self.move(x, y, 'chord')
+        board = MinesweeperGame.objects.get(id=self.game.id).board
+        cleared = [
+            [adjacent_x, adjacent_y] for adjacent_x, adjacent_y in adjacent
+            if not board.is_mined(adjacent_x, adjacent_y)
+        ]
+        self.assertTrue(cleared)
+        for adjacent_x, adjacent_y in cleared:
+            self.assertTrue(board.is_visible(adjacent_x, adjacent_y))
+        self.assertLessEqual(cleared, sorted(change[:2] for change in data['changes']))
+        self.assertNotEqual(data['game_status'], LOST)
+
+    def test_chord_on_an_unsatisfied_number_does_nothing(self):
+        x, y = self.numbered_cells()[0]
+        self.move(x, y)
+        before = MinesweeperGame.objects.get(id=self.game.id)
+
+        data = self.move(x, y, 'chord')
+        after = MinesweeperGame.objects.get(id=self.game.id)
+        self.assertEqual(data['changes'], [])
+        self.assertEqual(
+            (bytes(after.cells), after.version, after.turn_count),
+            (bytes(before.cells), before.version, before.turn_count)
+        )
+
+    def test_batch_applies_every_move_in_one_write(self):
+        cells = self.numbered_cells()[:3]
+        data = self.moves([[x, y, 'clear'] for x, y in cells])
+        self.assertEqual(data['moves_applied'], 3)
+        self.assertEqual(sorted(change[:2] for change in data['changes']), sorted(
+            [x, y] for x, y in cells
+        ))
+        game = MinesweeperGame.objects.get(id=self.game.id)
+        self.assertEqual(game.version, self.game.version + 1)
+        self.assertEqual(game.turn_count, 3)
+        for x, y in cells:
+            self.assertTrue(game.board.is_visible(x, y))
+
+    def test_batches_with_a_bad_move_are_rejected(self):
+        for moves in (
+            [[1, 5, 'flag'], [0, 0]],
+            [[1, 5, 'flag'], [0, 0, 'jump']],
+            [[1, 5, 'flag'], [0, 10, 'clear']],
+            [[1, 5, 'flag'], [0, 'a', 'clear']],
+            [[1, 5, 'flag']] * 101,
+            {'x': 0},
+            'clear',
+        ):
+            data = self.moves(moves)
+            self.assertNotIn('changes', data)
+            self.assertIn('move_type', data['message'])
+        game = MinesweeperGame.objects.get(id=self.game.id)
+        self.assertEqual(game.version, self.game.version)
+        self.assertEqual(game.turn_count, 0)
+
+
+@check_counts
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        self.game = new_game()
+        self.client = Client(HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.urls = (
+            (reverse('ajax_board_state'), {'game_id': self.game.id}),
+            (reverse('minesweeper', args=[self.game.id]), {}),
+        )
+
+    def test_unchanged_board_is_not_modified(self):
+        for url, data in self.urls:
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            with self.assertNumQueries(1):
+                response = self.client.get(url, data, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+
+    def test_move_changes_the_etag(self):
+        etags = [self.client.get(url, data)['ETag'] for url, data in self.urls]
+        self.client.post(reverse('ajax_submit_move'), {
+            'game_id': self.game.id, 'x': 1, 'y': 5, 'move_type': 'flag'
+        })
+        for (url, data), etag in zip(self.urls, etags):
+            response = self.client.get(url, data, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_moves_and_resets_must_be_posted(self):
+        for name in ('ajax_submit_move', 'ajax_submit_moves', 'ajax_reset_game'):
+            response = self.client.get(reverse(name), {
+                'game_id': self.game.id, 'x': 1, 'y': 5, 'move_type': 'flag'
+            })
+            self.assertEqual(response.status_code, 405, name)
+        self.assertEqual(MinesweeperGame.objects.get(id=self.game.id).version, self.game.version)
+
+
+@check_counts
+class RevealTest(TestCase):
+    """ A game that is over shows every cell without the cells being changed.
+    """
+
+    def setUp(self):
+        self.game = new_game()
+        self.mine = mined_cell(self.game)
+
+    def lose(self):
+        with game_for_update(self.game.id) as game:
+            game.user_move(self.mine[0], self.mine[1], 'clear')
+        return game
+
+    def test_loss_shows_every_cell(self):
+        game = self.lose()
+        self.assertEqual(game.status, LOST)
+        self.assertEqual(bytes(game.turn_set.get().changes), b'')
+        self.assertEqual(len(get_move_context(game, 0)['changes']), 100)
+
+        game = MinesweeperGame.objects.get(id=self.game.id)
+        self.assertEqual(bytes(game.cells), bytes(self.game.cells))
+        self.assertEqual(game.board.visible_value(*self.mine), 'mined')
+        self.assertNotIn(None, sum(game.get_visible_boardstate(), []))
+
+        response = Client(HTTP_X_REQUESTED_WITH='XMLHttpRequest').get(
+            reverse('ajax_board_tile'), {'game_id': self.game.id}
+        )
+        tile = json.loads(response.content.decode('utf-8'))['tile']
+        self.assertEqual(tile, game.get_client_json_boardstate('rle'))
+
+    def test_undo_hides_the_board_again(self):
+        self.lose()
+        with game_for_update(self.game.id) as game:
+            game.user_move(0, 0, 'undo')
+        self.assertEqual(len(get_move_context(game, 0)['changes']), 100)
+        game = MinesweeperGame.objects.get(id=self.game.id)
+        self.assertEqual(game.status, IN_PROGRESS)
+        self.assertIsNone(game.board.visible_value(*self.mine))
+
+    def test_cells_cannot_be_cleared_once_the_game_is_over(self):
+        self.lose()
+        with game_for_update(self.game.id) as game:
+            for index in range(len(game.board)):
+                game.user_move(*(game.board.coordinates(index) + ('clear',)))
+        self.assertEqual(game.turn_count, 1)
+
+    def test_cells_cannot_be_flagged_once_the_game_is_over(self):
+        lost = self.lose()
+        with game_for_update(self.game.id) as game:
+            game.user_move(0, 0, 'flag')
+        game = MinesweeperGame.objects.get(id=self.game.id)
+        self.assertEqual(
+            (bytes(game.cells), game.num_flags, game.version, game.turn_count),
+            (bytes(lost.cells), lost.num_flags, lost.version, lost.turn_count)
+        )
+
+
+@check_counts
+class LocMemStateCacheTest(TestCase):
+
+    def setUp(self):
+        self.game = new_game()
+
+    def flag(self, game_id, y):
+        with game_for_update(game_id) as game:
+            game.user_move(0, y, 'flag')
+        return game
+
+    def stored(self, game_id):
+        return MinesweeperGame.objects.get(id=game_id)
+
+    def assertFlushed(self, cached):
+        stored = self.stored(cached.id)
+        self.assertEqual(bytes(stored.cells), cached.board.to_bytes())
+        self.assertEqual(stored.version, cached.version)
+        self.assertEqual(stored.num_flags, cached.board.flags)
+        self.assertEqual(stored.hidden_safe_cells, cached.board.hidden_safe_cells)
+        self.assertEqual(stored.status, cached.status)
+        self.assertEqual(stored.turn_set.count(), cached.turn_count)
+
+    @locmem_state_cache(flush_every=3)
+    def test_flushes_every_flush_every_changes(self):
+        self.flag(self.game.id, 0)
+        game = self.flag(self.game.id, 1)
+        self.assertEqual(self.stored(self.game.id).version, self.game.version)
+        self.assertEqual(self.stored(self.game.id).turn_set.count(), 0)
+        self.assertEqual(game.unflushed_changes, 2)
+
+        game = self.flag(self.game.id, 2)
+        self.assertEqual(game.unflushed_changes, 0)
+        self.assertFlushed(game)
+        self.assertEqual(get_state_cache().stats['flushes'], 1)
+
+    @locmem_state_cache(flush_every=100)
+    def test_flushes_when_the_game_ends(self):
+        x, y = mined_cell(self.game)
+        self.flag(self.game.id, 0)
+        with game_for_update(self.game.id) as game:
+            game.user_move(x, y, 'clear')
+        self.assertEqual(game.status, LOST)
+        self.assertFlushed(game)
+
+    @locmem_state_cache(max_entries=1, flush_every=100)
+    def test_flushes_evicted_games(self):
+        other = new_game()
+        game = self.flag(self.game.id, 0)
+        self.flag(other.id, 0)
+        self.assertFlushed(game)
+        state_cache = get_state_cache()
+        self.assertEqual(state_cache.stats['evictions'], 1)
+        self.assertEqual(state_cache.evicting, {})
+        self.assertEqual(self.stored(other.id).version, other.version)
+
+    @locmem_state_cache(max_entries=1, flush_every=100)
+    def test_evicted_games_are_read_until_flushed(self):
+        other = new_game()
+        self.flag(self.game.id, 0)
+        state_cache = get_state_cache()
+        # Evict the game without flushing it yet, as another request would
+        other.defer_writes()
+        evicted = state_cache.store(other.id, pickle.dumps(other))
+        self.assertEqual(evicted, [str(self.game.id)])
+        self.assertEqual(get_game(self.game.id).version, self.game.version + 1)
+
+        # Playing the game again before the flush keeps its earlier change
+        game = self.flag(self.game.id, 1)
+        self.assertEqual(game.version, self.game.version + 2)
+        state_cache.evicted(self.game.id)
+        self.assertEqual(self.stored(self.game.id).version, self.game.version)
+        self.assertEqual(get_game(self.game.id).board.flags, 2)
+
+    @locmem_state_cache()
+    def test_counts_hits_and_misses(self):
+        self.flag(self.game.id, 0)
+        self.flag(self.game.id, 1)
+        get_game(self.game.id)
+        self.assertEqual(get_state_cache().stats, {
+            'hits': 2, 'misses': 1, 'evictions': 0, 'flushes': 0
+        })
+
+
+@check_counts
+class GameConsumerTest(ChannelTestCase):
+
+    def setUp(self):
+        self.game = new_game()
+        self.path = '/minesweeper/ws/{}/'.format(self.game.id)
+        self.client = self.connect()
+        self.other_client = self.connect()
+
+    def connect(self):
+        client = WSClient()
+        # Fails unless the connection is accepted
+        client.send_and_consume('websocket.connect', path=self.path)
+        return client
+
+    def send(self, content):
+        self.client.send_and_consume('websocket.receive', path=self.path, text=content)
+        return self.client.receive()
+
+    def test_unknown_games_are_rejected(self):
+        client = WSClient()
+        client.send_and_consume(
+            'websocket.connect', path='/minesweeper/ws/{}/'.format(self.game.id + 1),
+            check_accept=False
+        )
+        self.assertEqual(client.receive(json=False), {'accept': False})
+        Group(GameConsumer.group_name(self.game.id + 1)).send({'text': '{}'})
+        self.assertIsNone(client.receive())
+
+    def test_move_is_sent_to_every_socket(self):
+        response = self.send({'action': 'move', 'x': 1, 'y': 5, 'move_type': 'flag'})
+        self.assertEqual(response['action'], 'changes')
+        self.assertEqual(response['changes'], [[1, 5, 'flagged']])
+        self.assertEqual(response['version'], self.game.version + 1)
+        self.assertEqual(self.other_client.receive(), response)
+
+    def test_moves_are_applied_in_order(self):
+        response = self.send({'action': 'moves', 'moves': [[1, 5, 'flag'], [2, 5, 'flag']]})
+        self.assertEqual(response['moves_applied'], 2)
+        self.assertEqual(sorted(response['changes']), [[1, 5, 'flagged'], [2, 5, 'flagged']])
+        self.assertEqual(self.other_client.receive(), response)
+
+    def test_reset_sends_the_board(self):
+        self.send({'action': 'move', 'x': 1, 'y': 5, 'move_type': 'flag'})
+        self.other_client.receive()
+        response = self.send({'action': 'reset'})
+        self.assertEqual(response['action'], 'boardstate')
+        self.assertEqual(response['json_boardstate'], json.dumps([[None] * 10] * 10))
+        self.assertEqual(self.other_client.receive(), response)
+
+    def test_errors_are_only_sent_to_the_sender(self):
+        for content in (
+            {'action': 'move', 'x': 10, 'y': 5},
+            {'action': 'move', 'x': 1, 'y': 5, 'move_type': 'reset'},
+            {'action': 'moves', 'moves': [[1, 5]]},
+            {'action': 'dance'},
+        ):
+            self.assertEqual(self.send(content)['action'], 'error')
+        self.assertIsNone(self.other_client.receive())
+        self.assertEqual(MinesweeperGame.objects.get(id=self.game.id).version, self.game.version)
+
+
+@check_counts
+class QueryBudgetTest(TestCase):
+    """ Runs one round of the move benchmark so that a query regression fails the tests,
+        see the benchmark_minesweeper command.
+    """
+
+    sizes = (10, 30, 100)
+
+    def test_operations_are_within_their_query_budgets(self):
+        budgets_path = os.path.join(os.path.dirname(__file__), 'benchmark_budgets.json')
+        with open(budgets_path) as budgets_file:
+            budgets = json.load(budgets_file)
+        queries = {}
+        for result in MoveBenchmark(sizes=self.sizes, rounds=1).run():
+            key = '{}@{}'.format(result['operation'], result['size'])
+            self.assertIn(key, budgets)
+            self.assertLessEqual(result['queries'], budgets[key], key)
+            queries.setdefault(result['operation'], {})[result['size']] = result['queries']
+
+        # An operation costs the same number of queries whatever the size of the board
+        for operation, by_size in queries.items():
+            self.assertEqual(sorted(by_size), list(self.sizes), operation)
+            self.assertEqual(len(set(by_size.values())), 1, '{}: {}'.format(operation, by_size))
+
+
+@check_counts
+class ArchiveTest(TestCase):
+
+    def setUp(self):
+        self.game = new_game()
+        self.cutoff = timezone.now() + timedelta(minutes=1)
+
+    @locmem_state_cache(flush_every=100)
+    def test_idle_games_are_not_loaded_into_the_cache(self):
+        self.assertTrue(archive_game(self.game.id, self.cutoff))
+        state_cache = get_state_cache()
+        self.assertEqual(state_cache.entries, OrderedDict())
+        self.assertEqual(state_cache.stats['misses'], 0)
+        self.assertIsNotNone(MinesweeperGame.objects.get(id=self.game.id).archived)
+
+    @locmem_state_cache(flush_every=100)
+    def test_cached_games_are_flushed_and_dropped(self):
+        with game_for_update(self.game.id) as game:
+            game.user_move(1, 5, 'flag')
+        self.assertTrue(archive_game(self.game.id, self.cutoff))
+        self.assertEqual(get_state_cache().entries, OrderedDict())
+
+        game = MinesweeperGame.objects.get(id=self.game.id)
+        self.assertEqual(game.num_flags, 1)
+        self.assertEqual(unpack_moves(bytes(game.move_log), 10), [(1, 5, 'flag')])
+        # Moves read the archived game from the database and are ignored
+        with game_for_update(self.game.id) as game:
+            game.user_move(2, 5, 'flag')
+        self.assertEqual(MinesweeperGame.objects.get(id=self.game.id).num_flags, 1)
+
+    def test_games_played_since_the_cutoff_are_kept(self):
+        self.assertFalse(archive_game(self.game.id, self.game.updated))
+        self.assertIsNone(MinesweeperGame.objects.get(id=self.game.id).archived)
+
+
+@check_counts
+class DjangoStateCacheLockTest(TestCase):
+
+    def setUp(self):
+        self.state_cache = DjangoStateCache(lock_timeout=0.05)
+        self.key = self.state_cache.key(1) + ':lock'
+
+    def tearDown(self):
+        self.state_cache.cache.delete(self.key)
+
+    def test_lock_times_out_instead_of_running_unlocked(self):
+        with self.state_cache.lock(1):
+            with self.assertRaises(LockTimeout):
+                with self.state_cache.lock(1):
+                    pass
+        # The lock was released by its holder
+        with self.state_cache.lock(1):
+            pass
+
+    def test_only_the_holder_releases_the_lock(self):
+        with self.state_cache.lock(1):
+            # The lock expires and is taken by another process
+            self.state_cache.cache.set(self.key, 'other', 60)
+        self.assertEqual(self.state_cache.cache.get(self.key), 'other')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Checks the PostgreSQL query plan')
+@check_counts
+class LastTurnIndexTest(TestCase):
+
+    def test_last_turn_lookup_uses_the_index(self):
+        games = [new_game() for number in range(20)]
+        # The last 100 turns of every game were undone, so the index on (game, number)
+        # alone would have to skip them
+        Turn.objects.bulk_create([
+            Turn(game=game, number=number, move_type='flag', undone=number > 100)
+            for game in games for number in range(1, 201)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE minesweeper_turn')
+
+        with CaptureQueriesContext(connection) as queries:
+            last_turn = games[0].get_last_turn()
+        self.assertEqual(last_turn.number, 100)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + queries[-1]['sql'])
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('minesweeper_turn_game_id_undone_number_', plan)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Row locks need PostgreSQL')
+@check_counts
+class ConcurrentMoveTest(TransactionTestCase):
+    """ Sends moves to one game from several threads at once, each on its own database
+        connection, as separate requests would.
+    """
+
+    threads = 8
+    moves_per_thread = 20
+
+    def play(self, game_id, thread, errors):
+        try:
+            for move in range(self.moves_per_thread):
+                # Every thread toggles five flags of its own row, so there are never
+                # more flags than mines, and undoes every third move
+                move_type = 'undo' if move % 3 == 2 else 'flag'
+                with game_for_update(game_id) as game:
+                    game.user_move(thread, move % 5, move_type)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def test_concurrent_moves_are_serialized(self):
+        game = new_game(num_mines=50)
+        errors = []
+        threads = [
+            threading.Thread(target=self.play, args=(game.id, thread, errors))
+            for thread in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        game = MinesweeperGame.objects.get(id=game.id)
+        numbers = list(game.turn_set.order_by('number').values_list('number', flat=True))
+        self.assertEqual(numbers, list(range(1, game.turn_count + 1)))
+        flags = self.threads * (self.moves_per_thread - self.moves_per_thread // 3)
+        self.assertEqual(len(numbers), flags)
+        replayed = Replay.from_game(game).run()
+        self.assertEqual(replayed.board.to_bytes(), bytes(game.cells))
+        self.assertEqual(replayed.turn_count, game.turn_count)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Turn snapshots are PostgreSQL arrays')
+class SnapshotsToChangesTest(TransactionTestCase):
+    """ Runs the conversion of migration 0008 on turns saved with board snapshots.
+    """
+
+    migrate_from = [('minesweeper', '0007_turn_changes')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_snapshots_become_the_changes_of_each_turn(self):
+        MinesweeperGame = self.apps.get_model('minesweeper', 'MinesweeperGame')
+        Turn = self.apps.get_model('minesweeper', 'Turn')
+        # Cell 0 was cleared on the first turn and cell 1 flagged on the third, after
+        # the second turn was undone
+        game = MinesweeperGame.objects.create(
+            board_size=2, num_mines=1, cells=bytes(bytearray([0x21, 0x50, 0x01, 0x01]))
+        )
+        Turn.objects.create(game=game, number=1, hidden_fields=[0, 1, 2, 3], flagged_fields=[])
+        Turn.objects.create(
+            game=game, number=2, undone=True, hidden_fields=[1, 2, 3], flagged_fields=[]
+        )
+        Turn.objects.create(game=game, number=3, hidden_fields=[1, 2, 3], flagged_fields=[])
+
+        snapshots_to_changes.snapshots_to_changes(self.apps, None)
+        changes = dict(
+            (turn.number, unpack_states(turn.changes))
+            for turn in Turn.objects.filter(game=game)
+        )
+        self.assertEqual(changes, {1: {0: 0}, 2: {}, 3: {1: 0}})
@@ -1,10 +1,17 @@
 from django.conf.urls import url
-from minesweeper.ajax_views import AjaxProcessMove, AjaxResetGame
-from minesweeper.views import MinesweeperGameView
+from minesweeper.ajax_views import (
+    AjaxBoardState, AjaxBoardTile, AjaxProcessMove, AjaxProcessMoves, AjaxResetGame
+)
+from minesweeper.views import MetricsView, MinesweeperGameView, RenderBenchmarkView
 
 urlpatterns = [
     url(r'^game/(?P<game_id>\d+)/$', MinesweeperGameView.as_view(), name='minesweeper'),
     url(r'^game/$', MinesweeperGameView.as_view(), name='minesweeper_new'),
     url(r'^ajax_move/$', AjaxProcessMove.as_view(), name='ajax_submit_move'),
-    url(r'^ajax_reset/$', AjaxResetGame.as_view(), name='ajax_reset_game')
+    url(r'^ajax_moves/$', AjaxProcessMoves.as_view(), name='ajax_submit_moves'),
+    url(r'^ajax_reset/$', AjaxResetGame.as_view(), name='ajax_reset_game'),
+    url(r'^ajax_board/$', AjaxBoardState.as_view(), name='ajax_board_state'),
+    url(r'^ajax_tile/$', AjaxBoardTile.as_view(), name='ajax_board_tile'),
+    url(r'^metrics/$', MetricsView.as_view(), name='minesweeper_metrics'),
+    url(r'^render_benchmark/$', RenderBenchmarkView.as_view(), name='minesweeper_render_benchmark')
 ]
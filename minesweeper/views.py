@@ -1,38 +1,97 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect
-from django.views.generic import TemplateView
+from django.utils.decorators import method_decorator
+from django.views.generic import TemplateView, View
+from minesweeper.conditional import conditional_board
+from minesweeper.constants import LARGE_BOARD_SIZE, TILE_SIZE
 from minesweeper.forms import NewGameForm
+from minesweeper.instrumentation import is_enabled, registry
 from minesweeper.models import MinesweeperGame
+from minesweeper.state_cache import get_game
 
 
 class MinesweeperGameView(TemplateView):
     template_name = 'game.html'
 
-    def new_game(self, num_mines):
+    def new_game(self, num_mines, board_size=10):
         """ Starts a new game and redirects the user to the URL for that game.
         """
-        game = MinesweeperGame.objects.create(num_mines=num_mines)
+        game = MinesweeperGame.objects.create(num_mines=num_mines, board_size=board_size)
         game.start()
         return redirect('minesweeper', game_id=game.id)
 
+    @method_decorator(conditional_board)
     def get(self, request, *args, **kwargs):
         game_id = kwargs.pop('game_id', None)
         new_game_form = NewGameForm()
-        context = {'new_game_form': new_game_form}
+        context = {
+            'new_game_form': new_game_form,
+            'board_cache_timeout': getattr(settings, 'MINESWEEPER_BOARD_CACHE_TIMEOUT', 3600),
+        }
 
         try:
-            game = MinesweeperGame.objects.get(id=game_id)
+            game = get_game(game_id, defer_board=True)
         except MinesweeperGame.DoesNotExist:
             context['message'] = 'Game matching ID {} does not exist'.format(game_id)
             game = None
 
         if game:
             context['game'] = game
-            context['visible_array'] = game.get_visible_boardstate()
+            if game.board_size > LARGE_BOARD_SIZE:
+                # Large boards are loaded by the client in tiles
+                context['tile_size'] = TILE_SIZE
+            else:
+                # The rendered board is cached for each version of the game, so the board
+                # is passed uncalled and only loaded when the template misses the cache
+                context['visible_array'] = game.get_visible_boardstate
 
         return render(request, self.template_name, context,)
 
     def post(self, request, *args, **kwargs):
         new_game_form = NewGameForm(request.POST)
+        if not new_game_form.is_valid():
+            return redirect('minesweeper_new')
         return self.new_game(
-            num_mines=int(new_game_form.data['num_mines'])
+            num_mines=new_game_form.cleaned_data['num_mines'],
+            board_size=new_game_form.cleaned_data['board_size']
         )
+
+
+class RenderBenchmarkView(TemplateView):
+    """ A page that times how long minesweeper.js takes to render boards of several sizes,
+        for the boards that are rendered as buttons.
+    """
+    template_name = 'render_benchmark.html'
+
+    def get_context_data(self, **kwargs):
+        context = super(RenderBenchmarkView, self).get_context_data(**kwargs)
+        context['sizes'] = [10, 20, LARGE_BOARD_SIZE, 100]
+        context['rounds'] = 20
+        context['move_cells'] = 50
+        return context
+
+
+class MetricsView(View):
+    """ Returns the metrics recorded by minesweeper.instrumentation in this process, in the
+        Prometheus text format.  Only available when MINESWEEPER_INSTRUMENTATION is on.
+    """
+    metrics = (
+        ('calls_total', 'count'),
+        ('seconds_total', 'seconds'),
+        ('seconds_max', 'max_seconds'),
+        ('queries_total', 'queries'),
+        ('query_seconds_total', 'query_seconds'),
+        ('cells_total', 'cells'),
+    )
+
+    def get(self, request, *args, **kwargs):
+        if not is_enabled():
+            raise Http404('Instrumentation is disabled')
+
+        snapshot = registry.snapshot()
+        lines = []
+        for metric, key in self.metrics:
+            for name in sorted(snapshot):
+                lines.append('minesweeper_{}{{name="{}"}} {}'.format(metric, name, snapshot[name][key]))
+        return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4')
@@ -0,0 +1,18 @@
+"""
+ASGI config for webgames project.
+
+It exposes the channel layer as a module-level variable named ``channel_layer``.
+Serve it with an interface server such as ``daphne webgames.asgi:channel_layer``
+alongside ``manage.py runworker``.
+
+For more information on this file, see
+https://channels.readthedocs.io/en/1.x/deploying.html
+"""
+
+import os
+
+from channels.asgi import get_channel_layer
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "webgames.settings")
+
+channel_layer = get_channel_layer()
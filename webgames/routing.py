@@ -0,0 +1,5 @@
+from channels.routing import include
+
+channel_routing = [
+    include('minesweeper.routing.channel_routing', path=r'^/minesweeper'),
+]
@@ -38,11 +38,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django_extensions',
+    'channels',
     'basegame',
     'minesweeper'
 ]
 
 MIDDLEWARE = [
+    'minesweeper.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,6 +90,23 @@ DATABASES = {
     }
 }
 
+# Run against a local SQLite database instead, for example to run the benchmarks where
+# PostgreSQL is not available
+if os.environ.get('WEBGAMES_SQLITE'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'webgames.sqlite3'),
+    }
+
+# Channel layer for the game WebSockets, see webgames/asgi.py.  The in-memory layer only
+# works within a single process; use a shared layer such as asgi_redis in production.
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'asgiref.inmemory.ChannelLayer',
+        'ROUTING': 'webgames.routing.channel_routing',
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -134,3 +153,34 @@ MEDIA_URL = '/media/'
 STATICFILES_DIRS = (
     os.path.join(MEDIA_ROOT, 'common'),
 )
+
+
+# Minesweeper
+
+# Place the mines on the first clear instead of when the game is created
+MINESWEEPER_LAZY_MINES = True
+
+# Keep live games in a write-behind cache and flush them to the database in batches,
+# see minesweeper.state_cache
+MINESWEEPER_STATE_CACHE = None
+
+# Time the hot paths of every request and report them in Server-Timing headers and at
+# /minesweeper/metrics/, see minesweeper.instrumentation
+MINESWEEPER_INSTRUMENTATION = False
+
+# Seconds to cache the rendered board of each version of a game, 0 to disable
+MINESWEEPER_BOARD_CACHE_TIMEOUT = 3600
+
+# Boards generated ahead of time by the fill_board_pool command, as (board_size, num_mines).
+# Games started with one of these take a board from the pool instead of generating one,
+# which only happens when MINESWEEPER_LAZY_MINES is off.  A pool that falls below the low
+# water mark is topped back up to the high water mark.
+MINESWEEPER_BOARD_POOL = [(10, 10), (16, 40), (30, 150)]
+MINESWEEPER_BOARD_POOL_LOW_WATER = 50
+MINESWEEPER_BOARD_POOL_HIGH_WATER = 200
+
+# Place the mines of a lazy game so that the board can be cleared from the first clear
+# without guessing, spending at most MINESWEEPER_NO_GUESS_BUDGET seconds looking for such
+# a board, see minesweeper.solver
+MINESWEEPER_NO_GUESS = False
+MINESWEEPER_NO_GUESS_BUDGET = 0.1